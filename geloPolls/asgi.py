@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'geloPolls.settings')
 
 application = get_asgi_application()
+
+# Warm the hottest polls' payloads as soon as the worker is up
+from polls import hotness  # noqa: E402
+
+hotness.start()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,7 @@ API_MIDDLEWARE = []
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'polls.middleware.MessagePackMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +60,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'polls.middleware.SlowQueryMiddleware',
+    'polls.middleware.ProfilingMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -103,6 +107,21 @@ DATABASES = {
     }
 }
 
+# Polls can be spread over several databases, `default` being the first
+# shard. Create the tables of a new shard with `migrate --database shard_N`
+# and move polls around with `manage.py rebalance_shards`.
+POLLS_SHARD_COUNT = int(os.environ.get('POLLS_SHARD_COUNT', '1'))
+
+POLLS_SHARDS = ['default'] + ['shard_%d' % index for index in range(1, POLLS_SHARD_COUNT)]
+
+for alias in POLLS_SHARDS[1:]:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / ('db_%s.sqlite3' % alias),
+    }
+
+DATABASE_ROUTERS = ['polls.routers.ShardRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -144,3 +163,91 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Polls
+
+# Final results of closed polls are published here as <question id>.json
+POLLS_CLOSED_RESULTS_DIR = BASE_DIR / 'closed_polls'
+
+# When a web server or CDN serves POLLS_CLOSED_RESULTS_DIR, set its base URL
+# (e.g. '/closed-polls/') to redirect reads there instead of serving them
+POLLS_CLOSED_RESULTS_URL = None
+
+# Background tasks run by each worker after a request, see polls/tasks.py
+POLLS_TASKS = {
+    'MAX_WORKERS': 2,
+    'MAX_PENDING': 1000,
+    'MAX_RETRIES': 3,
+    'RETRY_DELAY': 0.5,
+    # Record tasks in the QueuedTask table until they succeed
+    'PERSISTENT': False,
+    # Refresh question snapshots after votes in the background
+    'ASYNC_SNAPSHOTS': False,
+}
+
+# Choices embedded in question payloads (most voted first), the full list is
+# paginated through ChoiceResource.page
+POLLS_CHOICES_PER_QUESTION = 100
+
+# Default and maximum page sizes of ChoiceResource.page
+POLLS_CHOICE_PAGE_SIZE = 100
+POLLS_MAX_CHOICE_PAGE_SIZE = 1000
+
+# Question payloads are cached for this many seconds, and replaced on writes.
+# Only used with a `default` cache shared by all workers (Redis, Memcached,
+# database...), not with the per-process LocMemCache used when CACHES is unset.
+POLLS_SNAPSHOT_CACHE_TIMEOUT = 300
+
+# Hot poll tracking and cache warming, see polls/hotness.py
+POLLS_HOTNESS = {
+    'ENABLED': True,
+    # Count-min sketch size, memory is WIDTH * DEPTH * 8 bytes per worker
+    'WIDTH': 2048,
+    'DEPTH': 4,
+    'TOP_K': 50,
+    # Questions preloaded into the cache every WARM_INTERVAL seconds
+    'WARM_COUNT': 20,
+    'WARM_INTERVAL': 60,
+}
+
+# Concurrent identical reads share one computation, see polls/singleflight.py
+POLLS_SINGLE_FLIGHT = {
+    'ENABLED': True,
+    # Also coalesce across workers through the cache backend (needs a cache
+    # shared by the workers, such as Redis or Memcached)
+    'CROSS_WORKER': False,
+    'LOCK_TIMEOUT': 5,
+    'RESULT_TIMEOUT': 1,
+    'POLL_INTERVAL': 0.01,
+}
+
+# API paths whose JSON responses can be negotiated to MessagePack
+POLLS_MSGPACK_PATH_PREFIXES = ['/api-sileo/v2/']
+
+# Opt-in cProfile capture of slow API requests, see polls/profiling.py.
+# Requests are profiled when they carry the signed HEADER printed by
+# `manage.py profiling_token`, or at random with SAMPLE_RATE. Captures are
+# saved as .pstats, `manage.py profiling_collapse` adds their folded stacks.
+POLLS_PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.0,
+    'HEADER': 'X-Polls-Profile',
+    'TOKEN_MAX_AGE': 24 * 60 * 60,
+    # Only requests at least this slow are saved
+    'THRESHOLD_MS': 200,
+    'DIR': BASE_DIR / 'profiles',
+    'KEEP': 200,
+    'PATH_PREFIXES': ['/api-sileo/'],
+}
+
+# Slow query log of API requests, summarized by `manage.py slow_queries`.
+# See polls/querylog.py.
+POLLS_SLOW_QUERIES = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 100,
+    'LOG_FILE': BASE_DIR / 'slow_queries.jsonl',
+    # Capture EXPLAIN QUERY PLAN once per query shape and worker
+    'EXPLAIN': True,
+    'PATH_PREFIXES': ['/api-sileo/'],
+}
@@ -0,0 +1,49 @@
+"""
+Lean runtime settings for API-only workers.
+
+Admin, messages, staticfiles, templates and Django REST framework are left
+out. auth, contenttypes and sessions are kept, with their middleware, so
+request.user is set as in the full profile. Select it with
+DJANGO_SETTINGS_MODULE=geloPolls.settings_api; compare it with the full
+profile using `python manage.py startup_benchmark`.
+
+The only possible win is startup time, and it is small: in three rounds of
+`startup_benchmark --runs 15 --path /polls/2/results.json` (medians, Python
+3.11, Django 5.2, SQLite, one CPU) time to first request was 310-347 ms
+with the full profile and 288-341 ms with this one, within the noise
+between rounds. Peak RSS is about 50 MiB with either profile; this profile
+does not reduce memory. These figures were taken with a stand-in for the
+sileo package, so its own import and setup cost is not included. Measure
+again with the real package before relying on them.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+
+# auth, contenttypes and sessions stay: Sileo resources may read request.user
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'polls',
+    'corsheaders',
+    'sileo',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'polls.middleware.MessagePackMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'polls.middleware.SlowQueryMiddleware',
+    'polls.middleware.ProfilingMiddleware',
+]
+
+ROOT_URLCONF = 'geloPolls.urls_api'
+
+# The API renders JSON only
+TEMPLATES = []
+
+AUTH_PASSWORD_VALIDATORS = []
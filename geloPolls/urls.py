@@ -20,5 +20,5 @@ from django.urls import include, path
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-sileo/', include('sileo.urls')),
-    # path('polls/', include('polls.urls')),
+    path('polls/', include('polls.urls')),
 ]
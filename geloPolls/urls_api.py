@@ -0,0 +1,9 @@
+"""
+URL configuration for API-only workers (see geloPolls.settings_api).
+"""
+from django.urls import include, path
+
+urlpatterns = [
+    path('api-sileo/', include('sileo.urls')),
+    path('polls/', include('polls.urls')),
+]
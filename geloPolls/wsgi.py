@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'geloPolls.settings')
 
 application = get_wsgi_application()
+
+# Warm the hottest polls' payloads as soon as the worker is up
+from polls import hotness  # noqa: E402
+
+hotness.start()
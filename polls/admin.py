@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db import router, transaction
 
+from . import snapshots
 from .models import Choice, Question
 
 
@@ -19,5 +21,24 @@ class QuestionAdmin(admin.ModelAdmin):
     
     list_filter = ['pub_date']
 
+    # Handling snapshots: the admin writes questions and choices directly,
+    # so it keeps their documents up to date like the API does
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        snapshots.refresh(form.instance)
+
+    def delete_model(self, request, obj):
+        question_id = obj.id
+        super().delete_model(request, obj)
+        transaction.on_commit(lambda: snapshots.discard(question_id), using=router.db_for_write(Question))
+
+    def delete_queryset(self, request, queryset):
+        question_ids = list(queryset.values_list('id', flat=True))
+        super().delete_queryset(request, queryset)
+        for question_id in question_ids:
+            transaction.on_commit(
+                lambda question_id=question_id: snapshots.discard(question_id), using=router.db_for_write(Question)
+            )
+
 
 admin.site.register(Question, QuestionAdmin)
\ No newline at end of file
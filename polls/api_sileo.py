@@ -1,18 +1,30 @@
-from .models import Question, Choice
+from .models import Question, Choice, QuestionSnapshot
+from .serializer import CHOICE_ORDERING, serialize_choice, serialize_question, top_choices_in_bulk
+from . import hotness, sharding, snapshots, wire
+from .singleflight import coalesce
 from django.views import View
 
 from sileo.resource import Resource
 from sileo.registration import register
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
+from collections import defaultdict
+import base64
+import heapq
 import json
 
+# Upper bound on the IDs accepted by QuestionResource.get_many
+MAX_BATCH_IDS = 100
+
 
 class ChoiceResource(Resource):
     query_set = Choice.objects.all()
     fields = ['id', 'choice_text', 'votes']
-    allowed_methods = ['get_pk', 'filter', 'create', 'update', 'delete']
+    allowed_methods = ['get_pk', 'filter', 'page', 'create', 'update', 'delete']
     filter_fields = ('choice_text__icontains',)
 
     # Handling the create method for Choice
@@ -43,20 +55,41 @@ class ChoiceResource(Resource):
                 'error': 'Choice text is required.'
             }
 
-        # Ensure the question exists
+        # Ensure the question exists, on its shard
+        db = sharding.shard_for(question_id)
         try:
-            question = Question.objects.get(pk=question_id)
+            question = Question.objects.using(db).get(pk=question_id)
         except Question.DoesNotExist:
             return {
                 'status_code': 400,
                 'error': 'Question not found.'
             }
 
-        # Create the Choice object
-        choice = Choice.objects.create(
-            question=question,
-            choice_text=choice_text
-        )
+        # Create the Choice object and refresh the question's snapshot.
+        # Closed polls can't change anymore: the question is locked so that
+        # a concurrent close() either sees the choice or makes this fail.
+        choice_id = None
+        try:
+            with transaction.atomic(using=db):
+                question = Question.objects.using(db).select_for_update().get(pk=question.pk)
+                if question.is_closed:
+                    return {
+                        'status_code': 400,
+                        'error': 'This poll is closed.'
+                    }
+                choice_id = sharding.allocate_choice(question)
+                choice = Choice.objects.using(db).create(
+                    id=choice_id,
+                    question=question,
+                    choice_text=choice_text
+                )
+                snapshots.refresh(question)
+        except Exception:
+            # The directory entry commits on its own unless the question
+            # lives on `default`, don't leave it behind
+            if choice_id is not None:
+                sharding.forget(choice_id, sharding.CHOICE)
+            raise
 
         # Return a serialized response
         return {
@@ -95,11 +128,22 @@ class ChoiceResource(Resource):
             }
 
         # Attempt to retrieve the Choice object
-        choice = get_object_or_404(Choice, pk=choice_id)
-
-        # Update the choice's text and save it
-        choice.choice_text = choice_text
-        choice.save()
+        db = sharding.shard_for(choice_id, sharding.CHOICE)
+        choice = get_object_or_404(Choice.objects.using(db), pk=choice_id)
+
+        # Update the choice's text and save it. Closed polls can't change
+        # anymore, the question is locked against a concurrent close().
+        with transaction.atomic(using=db):
+            question = Question.objects.using(db).select_for_update().get(pk=choice.question_id)
+            if question.is_closed:
+                return {
+                    'status_code': 400,
+                    'error': 'This poll is closed.'
+                }
+            # Only the text: the vote count may have moved since it was read
+            choice.choice_text = choice_text
+            choice.save(update_fields=['choice_text'])
+            snapshots.refresh(question)
 
         # Return a serialized response with the updated choice
         return {
@@ -128,10 +172,21 @@ class ChoiceResource(Resource):
         choice_id = data.get('pk', None)
 
         # Attempt to retrieve the Choice object
-        choice = get_object_or_404(Choice, pk=choice_id)
-
-        # Delete the choice
-        choice.delete()
+        db = sharding.shard_for(choice_id, sharding.CHOICE)
+        choice = get_object_or_404(Choice.objects.using(db), pk=choice_id)
+
+        # Delete the choice. Closed polls can't change anymore, the question
+        # is locked against a concurrent close().
+        with transaction.atomic(using=db):
+            question = Question.objects.using(db).select_for_update().get(pk=choice.question_id)
+            if question.is_closed:
+                return {
+                    'status_code': 400,
+                    'error': 'This poll is closed.'
+                }
+            choice.delete()
+            snapshots.refresh(question)
+        sharding.forget(choice_id, sharding.CHOICE)
 
         return {
             'status_code': 200,
@@ -142,23 +197,15 @@ class ChoiceResource(Resource):
         """
         Serialize a Question object into a dictionary.
         """
-        return {
-            'id': obj.id,
-            'question_text': obj.question_text,
-            'pub_date': obj.pub_date.isoformat(),  # Format date as ISO string
-            'choices': [self.serialize_choice(choice) for choice in obj.choices.all()]
-        }
+        return serialize_question(obj)
 
     def serialize_choice(self, choice):
         """
         Serialize a Choice object into a dictionary.
         """
-        return {
-            'id': choice.id,
-            'choice_text': choice.choice_text,
-            'votes': choice.votes,
-        }
+        return serialize_choice(choice)
 
+    @coalesce
     def get_pk(self, **kwargs):
         """
         If 'id' is provided, return the result view of that specific question.
@@ -169,7 +216,7 @@ class ChoiceResource(Resource):
 
         if question_id:
             # Return the result view of a single question, return (question and votes)
-            choice = get_object_or_404(Choice, pk=question_id)
+            choice = get_object_or_404(Choice.objects.using(sharding.shard_for(question_id, sharding.CHOICE)), pk=question_id)
             serialized_data = self.serialize_choice(choice)
             return {
                 'status_code': 200,
@@ -181,6 +228,76 @@ class ChoiceResource(Resource):
             'error': 'Question not found'
         }
 
+    # Handling cursor pagination over all the choices of a question
+    @coalesce
+    def page(self, **kwargs):
+        """
+        Return one page of a question's choices, most voted first.
+
+        Takes `question_id`, an optional `limit` and the `cursor` returned
+        by the previous page. The cursor marks the last choice seen, so
+        pages cost an index range scan however deep the client goes.
+        """
+        question_id = kwargs.get('question_id', self.request.GET.get('question_id'))
+        cursor = kwargs.get('cursor', self.request.GET.get('cursor'))
+        limit = kwargs.get('limit', self.request.GET.get('limit', settings.POLLS_CHOICE_PAGE_SIZE))
+
+        try:
+            question_id = int(question_id)
+            limit = min(max(int(limit), 1), settings.POLLS_MAX_CHOICE_PAGE_SIZE)
+        except (TypeError, ValueError):
+            return {
+                'status_code': 400,
+                'error': 'A numeric question_id and limit are required.'
+            }
+
+        # Like the question endpoints, hide questions that aren't published
+        db = sharding.shard_for(question_id)
+        if not Question.objects.using(db).filter(pk=question_id, pub_date__lte=timezone.now()).exists():
+            return {
+                'status_code': 404,
+                'error': 'Question not found'
+            }
+
+        queryset = Choice.objects.using(db).filter(
+            question_id=question_id
+        ).order_by(*CHOICE_ORDERING)
+        if cursor:
+            try:
+                votes, choice_id = self.decode_cursor(cursor)
+            except ValueError:
+                return {
+                    'status_code': 400,
+                    'error': 'Invalid cursor.'
+                }
+            queryset = queryset.filter(Q(votes__lt=votes) | Q(votes=votes, id__gt=choice_id))
+
+        choices = list(queryset[:limit + 1])
+        next_cursor = self.encode_cursor(choices[limit - 1]) if len(choices) > limit else None
+
+        return {
+            'status_code': 200,
+            'data': [self.serialize_choice(choice) for choice in choices[:limit]],
+            'next_cursor': next_cursor
+        }
+
+    def encode_cursor(self, choice):
+        """
+        Opaque cursor pointing right after `choice` in page order.
+        """
+        position = '%d:%d' % (choice.votes, choice.id)
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """
+        Return the (votes, id) position stored in a cursor.
+        """
+        try:
+            position = base64.urlsafe_b64decode(cursor.encode()).decode()
+        except (ValueError, UnicodeError):
+            raise ValueError('Invalid cursor')
+        votes, _, choice_id = position.partition(':')
+        return int(votes), int(choice_id)
 
 
 class QuestionResource(Resource):
@@ -189,7 +306,7 @@ class QuestionResource(Resource):
     related_fields = {
         'choices': ChoiceResource
     }
-    allowed_methods = ['get_pk', 'filter', 'create', 'update', 'delete']
+    allowed_methods = ['get_pk', 'get_many', 'filter', 'create', 'update', 'delete', 'close']
     filter_fields = ('question_text__icontains',)
 
     # Handling the create method for Question
@@ -216,11 +333,22 @@ class QuestionResource(Resource):
                 'error': 'Question text is required.'
             }
 
-        # Create the Question object
-        question = Question.objects.create(
-            question_text=question_text,
-            pub_date=timezone.now(),  # Use the current timestamp as the publication date
-        )
+        # Create the Question object along with its snapshot, on the shard
+        # picked for its ID
+        question_id, db = sharding.allocate_question()
+        try:
+            with transaction.atomic(using=db):
+                question = Question.objects.using(db).create(
+                    id=question_id,
+                    question_text=question_text,
+                    pub_date=timezone.now(),  # Use the current timestamp as the publication date
+                )
+                snapshots.refresh(question)
+        except Exception:
+            # The directory entry was committed first, don't leave it
+            # pointing at a question that was never written
+            sharding.forget(question_id)
+            raise
 
         # Return a serialized response
         return {
@@ -256,7 +384,8 @@ class QuestionResource(Resource):
             }
 
         # Attempt to retrieve the question
-        question = get_object_or_404(Question, pk=question_id)
+        db = sharding.shard_for(question_id)
+        question = get_object_or_404(Question.objects.using(db), pk=question_id)
 
         # Get the new question text from the data
         question_text = data.get('question_text', '')
@@ -268,9 +397,18 @@ class QuestionResource(Resource):
                 'error': 'Question text is required.'
             }
 
+        # Closed polls can't change anymore
+        if question.is_closed:
+            return {
+                'status_code': 400,
+                'error': 'This poll is closed.'
+            }
+
         # Update the question's question_text and save it
-        question.question_text = question_text
-        question.save()
+        with transaction.atomic(using=db):
+            question.question_text = question_text
+            question.save()
+            snapshots.refresh(question)
 
         # Return the serialized updated question
         return {
@@ -306,10 +444,15 @@ class QuestionResource(Resource):
             }
 
         # Attempt to retrieve the question
-        question = get_object_or_404(Question, pk=question_id)
+        db = sharding.shard_for(question_id)
+        question = get_object_or_404(Question.objects.using(db), pk=question_id)
 
-        # Delete the question
-        question.delete()
+        # Delete the question, its cached payload and the published results
+        # if it was closed
+        with transaction.atomic(using=db):
+            question.delete()
+            transaction.on_commit(lambda: snapshots.discard(question_id), using=db)
+        sharding.forget(question_id)
 
         return {
             'status_code': 200,
@@ -324,7 +467,8 @@ class QuestionResource(Resource):
         question_id = data.get('question_id')
         selected_choice_id = data.get('choice')
 
-        question = get_object_or_404(Question, pk=question_id)
+        db = sharding.shard_for(question_id)
+        question = get_object_or_404(Question.objects.using(db), pk=question_id)
         try:
             selected_choice = question.choices.get(pk=selected_choice_id)
         except Choice.DoesNotExist:
@@ -333,8 +477,19 @@ class QuestionResource(Resource):
                 'error': "You didn't select a valid choice."
             }
 
-        selected_choice.votes += 1
-        selected_choice.save()
+        # Lock the question so that a concurrent close() either sees this
+        # vote or makes it fail
+        with transaction.atomic(using=db):
+            question = Question.objects.using(db).select_for_update().get(pk=question.pk)
+            if question.is_closed:
+                return {
+                    'status_code': 400,
+                    'error': 'This poll is closed.'
+                }
+            Choice.objects.using(db).filter(pk=selected_choice.pk).update(votes=F('votes') + 1)
+            selected_choice.refresh_from_db(fields=['votes'])
+            snapshots.refresh_after_vote(question)
+        hotness.record('vote', [question.id])
 
         return {
             'status_code': 200,
@@ -350,11 +505,24 @@ class QuestionResource(Resource):
         Handle decreasing the votes for a specific choice.
         """
         choice_id = data.get('choice_id')
-        choice = get_object_or_404(Choice, pk=choice_id)
-
-        if choice.votes > 0:
-            choice.votes -= 1
-            choice.save()
+        db = sharding.shard_for(choice_id, sharding.CHOICE)
+        choice = get_object_or_404(Choice.objects.using(db), pk=choice_id)
+
+        # Lock the question so that a concurrent close() either sees this
+        # change or makes it fail
+        with transaction.atomic(using=db):
+            question = Question.objects.using(db).select_for_update().get(pk=choice.question_id)
+            if question.is_closed:
+                return {
+                    'status_code': 400,
+                    'error': 'This poll is closed.'
+                }
+            decremented = Choice.objects.using(db).filter(pk=choice.pk, votes__gt=0).update(votes=F('votes') - 1)
+            if decremented:
+                choice.refresh_from_db(fields=['votes'])
+                snapshots.refresh_after_vote(question)
+
+        if decremented:
             return {
                 'status_code': 200,
                 'message': 'Vote decremented successfully!',
@@ -366,40 +534,98 @@ class QuestionResource(Resource):
                 'message': 'Votes cannot be negative.'
             }
 
-    # Serialize Question
-    def serialize(self, obj):
+    # Handling closing a poll
+    def close(self, **kwargs):
         """
-        Serialize a Question object into a dictionary.
+        Close a published question: it stops accepting votes and its final
+        results are published as a static file.
         """
+        try:
+            # Extract the data from the request body
+            data = json.loads(self.request.body)
+        except json.JSONDecodeError:
+            return {
+                'status_code': 400,
+                'error': 'Invalid JSON format.'
+            }
+
+        question_id = data.get('pk', None)
+
+        # Ensure the question ID is provided
+        if not question_id:
+            return {
+                'status_code': 400,
+                'error': 'Question ID is required.'
+            }
+
+        db = sharding.shard_for(question_id)
+        question = get_object_or_404(Question.objects.using(db), pk=question_id, pub_date__lte=timezone.now())
+
+        if question.is_closed:
+            return {
+                'status_code': 400,
+                'error': 'This poll is already closed.'
+            }
+
+        # Only publish the file once the close is committed. Votes lock the
+        # question too: those in flight land before the final results are
+        # built, later ones see the poll closed.
+        with transaction.atomic(using=db):
+            question = Question.objects.using(db).select_for_update().get(pk=question.pk)
+            if question.is_closed:
+                return {
+                    'status_code': 400,
+                    'error': 'This poll is already closed.'
+                }
+            question.closed_at = timezone.now()
+            question.save()
+            payload = snapshots.refresh(question)
+            transaction.on_commit(lambda: snapshots.write_closed(question.id, payload), using=db)
+
         return {
-            'id': obj.id,
-            'question_text': obj.question_text,
-            'pub_date': obj.pub_date.isoformat(),  # Format date as ISO string
-            'choices': [self.serialize_choice(choice) for choice in obj.choices.all()]
+            'status_code': 200,
+            'data': json.loads(payload),
+            'message': 'Question closed successfully.'
         }
 
+    # Serialize Question
+    def serialize(self, obj, choices=None):
+        """
+        Serialize a Question object into a dictionary.
+
+        `choices` may be passed in when they were already loaded in bulk,
+        otherwise they are fetched from the question.
+        """
+        return serialize_question(obj, choices)
+
     def serialize_choice(self, choice):
         """
         Serialize a Choice object into a dictionary.
         """
-        return {
-            'id': choice.id,
-            'choice_text': choice.choice_text,
-            'votes': choice.votes,
-        }
+        return serialize_choice(choice)
 
     # Filter method to get the last five published questions, excluding future ones
+    @coalesce
     def filter(self, **kwargs):
         """
         Return the last five published questions (excluding future questions)
         in a serialized format.
+
+        Documents are read from the question snapshots: each shard returns
+        its own latest five and the lists are merged by publication date.
         """
-        queryset = Question.objects.filter(
-            pub_date__lte=timezone.now()
-        ).order_by('-pub_date')[:5]
+        now = timezone.now()
+        latest_per_shard = [
+            QuestionSnapshot.objects.using(db).filter(
+                pub_date__lte=now
+            ).order_by('-pub_date').values_list('question_id', 'pub_date', 'payload')[:5]
+            for db in sharding.shards()
+        ]
+        latest = list(heapq.merge(*latest_per_shard, key=lambda snapshot: snapshot[1], reverse=True))[:5]
 
-        # Serialize the queryset into a list of dictionaries
-        serialized_data = [self.serialize(question) for question in queryset]
+        # Serve the stored documents of the kept questions
+        serialized_data = [json.loads(bytes(payload)) for _, _, payload in latest]
+        hotness.record('filter', [question_id for question_id, _, _ in latest])
 
         return {
             'status_code': 200,
@@ -407,6 +633,7 @@ class QuestionResource(Resource):
         }
 
     # Handling get_pk for returning question details
+    @coalesce
     def get_pk(self, **kwargs):
         """
         If 'id' is provided, return the detail view of that specific question.
@@ -417,20 +644,131 @@ class QuestionResource(Resource):
         question_id = kwargs.get('pk', None)
 
         if question_id:
-            # Return the detail view of a single question
-            question = get_object_or_404(Question, pk=question_id, pub_date__lte=timezone.now())
-            serialized_data = self.serialize(question)
+            # Closed polls are answered from their static results file
+            payload = snapshots.load_closed(question_id)
+            if payload is not None:
+                hotness.record('get_pk', [question_id])
+                return {
+                    'status_code': 200,
+                    'data': json.loads(payload)
+                }
+
+            # Return the detail view of a single question from its snapshot,
+            # building the snapshot on first access
+            payload = snapshots.load(question_id)
+            if payload is None:
+                question = get_object_or_404(
+                    Question.objects.using(sharding.shard_for(question_id)),
+                    pk=question_id, pub_date__lte=timezone.now()
+                )
+                payload = snapshots.refresh(question)
+            hotness.record('get_pk', [question_id])
             return {
                 'status_code': 200,
-                'data': serialized_data
+                'data': json.loads(payload)
             }
 
         return {
             'status_code': 404,
             'error': 'Question not found'
         }
-  
-        
+
+    # Handling batch retrieval of several questions in one request
+    @coalesce
+    def get_many(self, **kwargs):
+        """
+        Return the detail view of several questions at once.
+
+        IDs come from `ids` (a list or a comma separated string) in the
+        kwargs, the query string or the JSON body. Documents are read from
+        the question snapshots with one query per shard, the response keeps
+        the requested order and lists the IDs not found.
+        """
+        question_ids = self.parse_ids(kwargs)
+
+        if question_ids is None:
+            return {
+                'status_code': 400,
+                'error': 'A list of numeric question IDs is required.'
+            }
+
+        if len(question_ids) > MAX_BATCH_IDS:
+            return {
+                'status_code': 400,
+                'error': 'At most %d question IDs can be requested at once.' % MAX_BATCH_IDS
+            }
+
+        now = timezone.now()
+        payloads = {}
+        for db, shard_question_ids in self.group_by_shard(question_ids).items():
+            stored = QuestionSnapshot.objects.using(db).filter(pub_date__lte=now).in_bulk(shard_question_ids)
+            payloads.update((question_id, bytes(snapshot.payload)) for question_id, snapshot in stored.items())
+
+            # Build the snapshots missing on first access, loading the top
+            # choices of those questions in a single query
+            unbuilt = [question_id for question_id in shard_question_ids if question_id not in stored]
+            if unbuilt:
+                questions = Question.objects.using(db).filter(pub_date__lte=now).in_bulk(unbuilt)
+                choices_by_question = top_choices_in_bulk(questions, using=db)
+                for question_id, question in questions.items():
+                    payloads[question_id] = snapshots.refresh(question, choices_by_question[question_id])
+
+        serialized_data = []
+        missing = []
+        for question_id in question_ids:
+            payload = payloads.get(question_id)
+            if payload is None:
+                missing.append(question_id)
+                continue
+            serialized_data.append(json.loads(payload))
+
+        hotness.record('get_many', payloads)
+
+        return {
+            'status_code': 200,
+            'data': serialized_data,
+            'missing': missing
+        }
+
+    def parse_ids(self, kwargs):
+        """
+        Read the requested question IDs, de-duplicated in request order.
+        Return None when they are absent or not all integers.
+        """
+        raw_ids = kwargs.get('ids')
+        if raw_ids is None:
+            raw_ids = self.request.GET.get('ids')
+        if raw_ids is None and self.request.body:
+            try:
+                raw_ids = json.loads(self.request.body).get('ids')
+            except (json.JSONDecodeError, AttributeError):
+                return None
+        if not raw_ids:
+            return None
+        if isinstance(raw_ids, str):
+            raw_ids = raw_ids.split(',')
+
+        try:
+            question_ids = [int(raw_id) for raw_id in raw_ids]
+        except (TypeError, ValueError):
+            return None
+        return list(dict.fromkeys(question_ids))
+
+    def group_by_shard(self, questions):
+        """
+        Group questions, or question IDs, by the database holding them.
+        """
+        if questions and isinstance(questions[0], Question):
+            placement = {question.id: question._state.db for question in questions}
+        else:
+            placement = sharding.shards_for(questions)
+
+        question_ids_by_shard = defaultdict(list)
+        for question_id, db in placement.items():
+            question_ids_by_shard[db].append(question_id)
+        return question_ids_by_shard
+
+
 class VotingResource(Resource):
     query_set = Choice.objects.all()
     fields = ['id', 'choice_text', 'votes']
@@ -440,11 +778,7 @@ class VotingResource(Resource):
         """
         Serialize a Choice object into a dictionary.
         """
-        return {
-            'id': choice.id,
-            'choice_text': choice.choice_text,
-            'votes': choice.votes,
-        }
+        return serialize_choice(choice)
 
     def create(self, **kwargs):
         """
@@ -470,16 +804,28 @@ class VotingResource(Resource):
 
         # Attempt to get the Choice object
         try:
-            choice = Choice.objects.get(pk=choice_id)
+            db = sharding.shard_for(choice_id, sharding.CHOICE)
+            choice = Choice.objects.using(db).get(pk=choice_id)
         except Choice.DoesNotExist:
             return {
                 'status_code': 400,
                 'error': 'Choice not found.'
             }
 
-        # Increment the vote count
-        choice.votes += 1
-        choice.save()
+        # Increment the vote count. Closed polls reject further votes: the
+        # question is locked so that a concurrent close() either sees this
+        # vote or makes it fail
+        with transaction.atomic(using=db):
+            question = Question.objects.using(db).select_for_update().get(pk=choice.question_id)
+            if question.is_closed:
+                return {
+                    'status_code': 400,
+                    'error': 'This poll is closed.'
+                }
+            Choice.objects.using(db).filter(pk=choice.pk).update(votes=F('votes') + 1)
+            choice.refresh_from_db(fields=['votes'])
+            snapshots.refresh_after_vote(question)
+        hotness.record('vote', [choice.question_id])
 
         # Serialize the updated choice object
         serialized_data = self.serialize(choice)
@@ -491,11 +837,77 @@ class VotingResource(Resource):
         }
 
 
+class StatsResource(Resource):
+    query_set = Question.objects.none()
+    allowed_methods = ['filter']
+
+    def filter(self, **kwargs):
+        """
+        Return this worker's access statistics: requests per method and the
+        hottest questions with their estimated access counts.
+        """
+        return {
+            'status_code': 200,
+            'data': hotness.get_tracker().stats()
+        }
+
+
+# v2 resources answer like v1 in the compact layout described in polls/wire.py
+class ChoiceV2Resource(ChoiceResource):
+
+    def create(self, **kwargs):
+        return wire.response_v2(super().create(**kwargs), wire.choice_row, self.request)
+
+    def update(self, **kwargs):
+        return wire.response_v2(super().update(**kwargs), wire.choice_row, self.request)
+
+    def get_pk(self, **kwargs):
+        return wire.response_v2(super().get_pk(**kwargs), wire.choice_row, self.request)
+
+    def page(self, **kwargs):
+        return wire.response_v2(super().page(**kwargs), wire.choice_row, self.request)
+
+
+class QuestionV2Resource(QuestionResource):
+    related_fields = {
+        'choices': ChoiceV2Resource
+    }
+
+    def create(self, **kwargs):
+        return wire.response_v2(super().create(**kwargs), wire.question_v2, self.request)
+
+    def update(self, **kwargs):
+        return wire.response_v2(super().update(**kwargs), wire.question_v2, self.request)
+
+    def close(self, **kwargs):
+        return wire.response_v2(super().close(**kwargs), wire.question_v2, self.request)
+
+    def filter(self, **kwargs):
+        return wire.response_v2(super().filter(**kwargs), wire.question_v2, self.request)
+
+    def get_pk(self, **kwargs):
+        return wire.response_v2(super().get_pk(**kwargs), wire.question_v2, self.request)
+
+    def get_many(self, **kwargs):
+        return wire.response_v2(super().get_many(**kwargs), wire.question_v2, self.request)
+
+
+class VotingV2Resource(VotingResource):
+
+    def create(self, **kwargs):
+        return wire.response_v2(super().create(**kwargs), wire.choice_row, self.request)
+
+
 # Register the resources to make them available via HTTP requests
 register(namespace='vote', name='vote', resource=VotingResource, version='v1')
+register(namespace='stats', name='hot', resource=StatsResource, version='v1')
 register(namespace='choice', name='choice', resource=ChoiceResource, version='v1')
 register(namespace='question', name='question', resource=QuestionResource, version='v1')
 
+register(namespace='vote', name='vote', resource=VotingV2Resource, version='v2')
+register(namespace='choice', name='choice', resource=ChoiceV2Resource, version='v2')
+register(namespace='question', name='question', resource=QuestionV2Resource, version='v2')
+
 
 
 
@@ -0,0 +1,245 @@
+"""
+Hot poll detection and cache warming.
+
+Every worker counts the question accesses of `get_pk`, `filter`, `get_many`
+and votes in a count-min sketch and keeps the most accessed questions in a
+small top-K heap, so memory stays bounded however many polls exist. The
+counts are halved on every warming round so that they follow current
+traffic.
+
+A background warmer, started with the worker (see geloPolls/wsgi.py) or
+else with its first recorded access, preloads the snapshot payloads of the
+hottest questions into the cache (see snapshots.load) and publishes its
+top list to the cache so that freshly started workers warm up with what the
+others found hot. Nothing is preloaded unless snapshots.cache_enabled().
+"""
+import heapq
+import logging
+import os
+import threading
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'WIDTH': 2048,
+    'DEPTH': 4,
+    'TOP_K': 50,
+    'WARM_COUNT': 20,
+    'WARM_INTERVAL': 60,
+}
+
+# Cache key of the hot questions shared between workers
+SHARED_HOT_KEY = 'polls:hot'
+
+
+def hotness_settings():
+    """
+    POLLS_HOTNESS merged over the defaults.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_HOTNESS', {})}
+
+
+class CountMinSketch:
+    """
+    Approximate counts in `depth` rows of `width` counters. Estimates never
+    undercount, and overcount by little as long as width is large compared
+    to the number of hot keys.
+    """
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.rows = [array('q', bytes(8 * width)) for _ in range(depth)]
+
+    def buckets(self, key):
+        return [hash((seed, key)) % self.width for seed in range(len(self.rows))]
+
+    def add(self, key, count=1):
+        """
+        Count `key` and return its new estimate.
+        """
+        estimate = None
+        for row, bucket in zip(self.rows, self.buckets(key)):
+            row[bucket] += count
+            estimate = row[bucket] if estimate is None else min(estimate, row[bucket])
+        return estimate
+
+    def estimate(self, key):
+        return min(row[bucket] for row, bucket in zip(self.rows, self.buckets(key)))
+
+    def decay(self):
+        """
+        Halve every counter, aging out past traffic.
+        """
+        for row in self.rows:
+            for bucket in range(self.width):
+                row[bucket] >>= 1
+
+
+class TopK:
+    """
+    The `k` keys with the highest estimates seen so far.
+    """
+
+    def __init__(self, k=50):
+        self.k = k
+        self.counts = {}
+        self._heap = []
+
+    def update(self, key, estimate):
+        if key not in self.counts and len(self.counts) >= self.k:
+            self._drop_stale()
+            if estimate <= self._heap[0][0]:
+                return
+            _, evicted = heapq.heappop(self._heap)
+            del self.counts[evicted]
+        self.counts[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _drop_stale(self):
+        # Heap entries superseded by a later update of their key
+        while self.counts.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def decay(self):
+        self.counts = {key: count >> 1 for key, count in self.counts.items()}
+        self._heap = [(count, key) for key, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def most_common(self, n=None):
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class HotTracker:
+    """
+    Per-worker access tracking of questions.
+    """
+
+    def __init__(self, width=2048, depth=4, top_k=50):
+        self.sketch = CountMinSketch(width, depth)
+        self.top = TopK(top_k)
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, kind, question_ids):
+        with self._lock:
+            self.requests[kind] += 1
+            for question_id in question_ids:
+                question_id = int(question_id)
+                self.top.update(question_id, self.sketch.add(question_id))
+
+    def hottest(self, n=None):
+        with self._lock:
+            return self.top.most_common(n)
+
+    def decay(self):
+        with self._lock:
+            self.sketch.decay()
+            self.top.decay()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'worker': os.getpid(),
+                'requests': dict(self.requests),
+                'hot_questions': [
+                    {'question_id': question_id, 'estimate': estimate}
+                    for question_id, estimate in self.top.most_common()
+                ],
+            }
+
+
+class Warmer(threading.Thread):
+    """
+    Preload the hottest questions into the cache now and on a schedule.
+    """
+
+    def __init__(self, tracker, count, interval):
+        super().__init__(name='polls-warmer', daemon=True)
+        self.tracker = tracker
+        self.count = count
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                self.warm()
+            except Exception:
+                logger.exception('Warming the hottest questions failed')
+            if self.stopped.wait(self.interval):
+                return
+            self.tracker.decay()
+
+    def warm(self):
+        from django.db import connections
+
+        from . import snapshots
+
+        # Older shared counts fade like the local ones
+        shared = cache.get(SHARED_HOT_KEY) or []
+        merged = Counter({question_id: count >> 1 for question_id, count in shared})
+        merged.update(dict(self.tracker.hottest(self.count)))
+        hottest = merged.most_common(self.count)
+        cache.set(SHARED_HOT_KEY, hottest, None)
+
+        if not snapshots.cache_enabled():
+            return
+        try:
+            for question_id, _ in hottest:
+                snapshots.load(question_id)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_tracker = None
+_warmer = None
+_pid = None
+_start_lock = threading.Lock()
+
+
+def get_tracker():
+    """
+    Return this worker's tracker, starting its warmer on first use when
+    tracking is enabled.
+    """
+    global _tracker, _warmer, _pid
+    if _pid == os.getpid():
+        return _tracker
+    with _start_lock:
+        if _pid != os.getpid():
+            options = hotness_settings()
+            _tracker = HotTracker(options['WIDTH'], options['DEPTH'], options['TOP_K'])
+            _warmer = None
+            if options['ENABLED']:
+                _warmer = Warmer(_tracker, options['WARM_COUNT'], options['WARM_INTERVAL'])
+                _warmer.start()
+            _pid = os.getpid()
+    return _tracker
+
+
+def start():
+    """
+    Start warming when the worker starts, rather than on its first request.
+    """
+    if hotness_settings()['ENABLED']:
+        get_tracker()
+
+
+def record(kind, question_ids):
+    """
+    Count an access of `kind` to the given questions.
+    """
+    if hotness_settings()['ENABLED']:
+        get_tracker().record(kind, question_ids)
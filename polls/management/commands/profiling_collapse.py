@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from polls.profiling import capture_dir, collapse, profiling_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the folded stacks (.collapsed files for flamegraph.pl or "
+        "speedscope) of the saved profiling captures that don't have them yet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Captures directory, defaults to POLLS_PROFILING['DIR'].")
+        parser.add_argument('--force', action='store_true', help='Rebuild existing .collapsed files too.')
+
+    def handle(self, *args, **options):
+        directory = capture_dir({'DIR': options['dir'] or profiling_settings()['DIR']})
+        for capture in sorted(directory.glob('*.pstats')):
+            if capture.with_suffix('.collapsed').exists() and not options['force']:
+                continue
+            self.stdout.write(str(collapse(capture)))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from polls.profiling import make_token, profiling_settings
+
+
+class Command(BaseCommand):
+    help = "Print a signed header value that makes an API request run under the profiler."
+
+    def handle(self, *args, **options):
+        options = profiling_settings()
+        self.stdout.write('%s: %s' % (options['HEADER'], make_token()))
+        if not options['ENABLED']:
+            self.stderr.write("POLLS_PROFILING['ENABLED'] is off, the header will be ignored.")
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from polls import sharding
+from polls.models import Choice, Question, QuestionSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Move polls between the POLLS_SHARDS databases. Run it with --adopt "
+        "once after enabling sharding, before serving traffic, to register "
+        "the polls that already exist. Writes to a poll while it is being "
+        "moved may be lost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--adopt', action='store_true', help='Register polls that have no directory entry yet.')
+        parser.add_argument('--all', action='store_true', help='Move every poll to the shard its ID maps to.')
+        parser.add_argument('--question', type=int, help='ID of a single poll to move.')
+        parser.add_argument('--to', help='Target shard of --question.')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the moves.')
+
+    def handle(self, *args, **options):
+        if not sharding.is_sharded():
+            raise CommandError('Polls are not sharded, set POLLS_SHARD_COUNT above 1.')
+
+        if options['adopt']:
+            self.adopt(options['dry_run'])
+
+        if options['question'] is not None:
+            if options['to'] not in sharding.shards():
+                raise CommandError('--to must be one of %s.' % ', '.join(sharding.shards()))
+            self.move(options['question'], options['to'], options['dry_run'])
+
+        if options['all']:
+            placed = sharding.directory().filter(kind=sharding.QUESTION).values_list('object_id', flat=True)
+            for question_id in placed.iterator():
+                self.move(question_id, sharding.home_shard(question_id), options['dry_run'])
+
+    def adopt(self, dry_run):
+        """
+        Give every question found on a shard, and its choices, a directory
+        entry pointing at that shard. Stops at the first question or choice
+        ID already registered elsewhere, which needs fixing by hand.
+        """
+        for db in sharding.shards():
+            for question_id in Question.objects.using(db).values_list('id', flat=True).iterator():
+                registered = sharding.directory().filter(
+                    kind=sharding.QUESTION, object_id=question_id
+                ).values_list('shard', flat=True).first()
+                if registered == db:
+                    continue
+                if registered is not None:
+                    raise CommandError(
+                        'Question %d is on both %s and %s, possibly left over by an interrupted move.'
+                        % (question_id, db, registered)
+                    )
+                self.stdout.write('Adopting question %d on %s' % (question_id, db))
+                if not dry_run:
+                    choice_ids = Choice.objects.using(db).filter(question_id=question_id).values_list('id', flat=True)
+                    try:
+                        sharding.place(question_id, choice_ids, db)
+                    except sharding.DirectoryConflict as error:
+                        raise CommandError('Cannot adopt question %d on %s: %s' % (question_id, db, error))
+
+    def move(self, question_id, target, dry_run):
+        """
+        Copy a poll to `target`, point its directory entries there, then
+        delete it from its previous shard. Safe to rerun if interrupted.
+        """
+        source = sharding.shard_for(question_id)
+        if source == target:
+            return
+        self.stdout.write('Moving question %d from %s to %s' % (question_id, source, target))
+        if dry_run:
+            return
+
+        try:
+            question = Question.objects.using(source).get(pk=question_id)
+        except Question.DoesNotExist:
+            raise CommandError('Question %d not found on %s.' % (question_id, source))
+        choices = list(Choice.objects.using(source).filter(question_id=question_id))
+        snapshots = list(QuestionSnapshot.objects.using(source).filter(pk=question_id))
+
+        with transaction.atomic(using=target):
+            # Leftovers of an interrupted move
+            Question.objects.using(target).filter(pk=question_id).delete()
+            Question.objects.using(target).bulk_create([question])
+            Choice.objects.using(target).bulk_create(choices)
+            QuestionSnapshot.objects.using(target).bulk_create(snapshots)
+
+        try:
+            sharding.place(question_id, [choice.id for choice in choices], target)
+        except sharding.DirectoryConflict as error:
+            Question.objects.using(target).filter(pk=question_id).delete()
+            raise CommandError('Cannot move question %d to %s: %s' % (question_id, target, error))
+
+        with transaction.atomic(using=source):
+            Question.objects.using(source).filter(pk=question_id).delete()
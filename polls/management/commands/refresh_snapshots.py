@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from polls import sharding, snapshots
+from polls.models import Question
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the snapshots of the questions that have none, for instance "
+        "questions written before snapshots existed. With --all, rebuild "
+        "every snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild existing snapshots too.')
+
+    def handle(self, *args, **options):
+        refreshed = 0
+        for db in sharding.shards():
+            questions = Question.objects.using(db).order_by('id')
+            if not options['all']:
+                questions = questions.filter(snapshot__isnull=True)
+            for question in questions.iterator():
+                with transaction.atomic(using=db):
+                    snapshots.refresh(question)
+                refreshed += 1
+        self.stdout.write(self.style.SUCCESS('Refreshed %d snapshots.' % refreshed))
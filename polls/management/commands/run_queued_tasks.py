@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from polls.models import QueuedTask
+from polls.tasks import TaskExecutor, import_task, task_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the persistent background tasks left in the QueuedTask table, "
+        "for instance by a worker that crashed before finishing them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Run at most this many tasks.')
+
+    def handle(self, *args, **options):
+        # Run in this process, one task at a time, with the configured retries
+        executor = TaskExecutor(max_retries=task_settings()['MAX_RETRIES'], retry_delay=task_settings()['RETRY_DELAY'])
+        queued = QueuedTask.objects.order_by('id')[:options['limit']]
+
+        ran = 0
+        for task in queued:
+            executor.run(task.key, import_task(task.func), task.args, task.kwargs, record_id=task.pk)
+            ran += 1
+        executor.shutdown()
+
+        left = QueuedTask.objects.count()
+        self.stdout.write(self.style.SUCCESS('Ran %d queued tasks, %d left.' % (ran, left)))
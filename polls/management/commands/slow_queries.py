@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from polls.querylog import log_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the slow query log by query shape, slowest total time "
+        "first, with the resources that issued them and their query plan."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', help="Log to read, defaults to POLLS_SLOW_QUERIES['LOG_FILE'].")
+        parser.add_argument('--limit', type=int, default=20, help='Number of query shapes to show.')
+        parser.add_argument('--full-scans', action='store_true', help='Only show shapes with a flagged plan.')
+
+    def handle(self, *args, **options):
+        path = Path(options['file']) if options['file'] else log_file()
+        if not path.exists():
+            raise CommandError('No slow query log at %s.' % path)
+
+        shapes = {}
+        with path.open() as log:
+            for line in log:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                summary = shapes.setdefault(entry['shape'], {
+                    'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'sources': set(), 'plan': [], 'flags': [],
+                })
+                summary['count'] += 1
+                summary['total_ms'] += entry['duration_ms']
+                summary['max_ms'] = max(summary['max_ms'], entry['duration_ms'])
+                summary['sources'].add('%s.%s' % (entry['resource'], entry['method']))
+                if entry.get('plan'):
+                    summary['plan'] = entry['plan']
+                    summary['flags'] = entry.get('flags', [])
+
+        ranked = sorted(shapes.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        if options['full_scans']:
+            ranked = [item for item in ranked if item[1]['flags']]
+        for shape, summary in ranked[:options['limit']]:
+            self.stdout.write('%d x, %.1f ms total, %.1f ms max, avg %.1f ms, from %s' % (
+                summary['count'], summary['total_ms'], summary['max_ms'],
+                summary['total_ms'] / summary['count'], ', '.join(sorted(summary['sources'])),
+            ))
+            self.stdout.write('  %s' % shape)
+            for detail in summary['plan']:
+                self.stdout.write('    plan: %s' % detail)
+            for flag in summary['flags']:
+                self.stdout.write(self.style.WARNING('    ! %s' % flag))
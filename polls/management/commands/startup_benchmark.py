@@ -0,0 +1,101 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs in a fresh interpreter so every measurement is a real cold start
+PROBE = '''
+import json, resource, time
+started = time.perf_counter()
+import django
+imported = time.perf_counter()
+django.setup()
+set_up = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': %(path)r, 'HTTP_HOST': 'localhost'}
+setup_testing_defaults(environ)
+status = []
+WSGIHandler()(environ, lambda code, headers: status.append(code))
+first_request = time.perf_counter()
+print(json.dumps({
+    'import_django': imported - started,
+    'django_setup': set_up - imported,
+    'first_request': first_request - set_up,
+    'total': first_request - started,
+    'status': status[0],
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker cold start for one or more settings profiles: Django "
+        "import, django.setup(), time to first request, peak RSS and the "
+        "packages that dominate import time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile', nargs='+', dest='profiles',
+            default=[settings.SETTINGS_MODULE, 'geloPolls.settings_api'],
+            help='Settings modules to compare (default: current and geloPolls.settings_api).',
+        )
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts per profile.')
+        parser.add_argument('--path', default='/api-sileo/', help='URL used for the first request.')
+        parser.add_argument('--top', type=int, default=10, help='Packages listed in the import breakdown.')
+
+    def handle(self, *args, **options):
+        for profile in dict.fromkeys(options['profiles']):
+            runs = [self.cold_start(profile, options['path']) for _ in range(options['runs'])]
+            self.report(profile, runs, options['top'])
+
+    def cold_start(self, profile, path):
+        """
+        Start one interpreter with `-X importtime` and return its timings
+        together with the self import time of each top-level package.
+        """
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile)
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE % {'path': path}],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        imports = defaultdict(int)
+        for line in completed.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, _, name = line[len('import time:'):].split('|')
+            imports[name.strip().split('.')[0]] += int(self_us)
+        result['imports'] = imports
+        return result
+
+    def report(self, profile, runs, top):
+        self.stdout.write(self.style.MIGRATE_HEADING('%s (median of %d runs)' % (profile, len(runs))))
+        for phase in ('import_django', 'django_setup', 'first_request', 'total'):
+            median = statistics.median(run[phase] for run in runs)
+            self.stdout.write('  %-16s %8.1f ms' % (phase, median * 1000))
+        rss = statistics.median(run['max_rss_kb'] for run in runs)
+        self.stdout.write('  %-16s %8.1f MiB' % ('max_rss', rss / 1024))
+        self.stdout.write('  %-16s %s' % ('status', runs[-1]['status']))
+
+        packages = defaultdict(list)
+        for run in runs:
+            for name, self_us in run['imports'].items():
+                packages[name].append(self_us)
+        slowest = sorted(
+            ((statistics.median(times), name) for name, times in packages.items()),
+            reverse=True,
+        )[:top]
+        self.stdout.write('  import time by package:')
+        for self_us, name in slowest:
+            self.stdout.write('    %-28s %8.1f ms' % (name, self_us / 1000))
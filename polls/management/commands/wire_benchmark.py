@@ -0,0 +1,82 @@
+import datetime
+import gzip
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+from polls import wire
+from polls.middleware import MessagePackMiddleware, msgpack
+from polls.serializer import serialize_choice
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the payload size and encode time of the v1 and v2 wire "
+        "formats (and MessagePack when installed) on synthetic large polls. "
+        "Encoding is timed the way responses are served: the v1 document "
+        "converted by the v2 resource, rendered as a JsonResponse, then "
+        "through MessagePackMiddleware."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--choices', type=int, nargs='+', default=[10, 100, 1000, 10000],
+                            help='Poll sizes to measure, in choices.')
+        parser.add_argument('--runs', type=int, default=20, help='Encodings per measurement.')
+
+    def handle(self, *args, **options):
+        self.stdout.write('%8s  %-12s %12s %12s %10s' % ('choices', 'format', 'bytes', 'gzip bytes', 'encode ms'))
+        for size in options['choices']:
+            document = self.document(size)
+
+            def v1(request):
+                return {'status_code': 200, 'data': document}
+
+            def v2(request):
+                return wire.response_v2({'status_code': 200, 'data': document}, wire.question_v2, request)
+
+            formats = [
+                ('v1 json', lambda: self.serve(v1, 'application/json')),
+                ('v2 json', lambda: self.serve(v2, 'application/json')),
+            ]
+            if msgpack is not None:
+                formats.append(('v2 msgpack', lambda: self.serve(v2, 'application/msgpack')))
+
+            for name, encode in formats:
+                timings = []
+                for _ in range(options['runs']):
+                    started = time.perf_counter()
+                    payload = encode()
+                    timings.append(time.perf_counter() - started)
+                self.stdout.write('%8d  %-12s %12d %12d %10.3f' % (
+                    size, name, len(payload), len(gzip.compress(payload)), statistics.median(timings) * 1000
+                ))
+
+    def serve(self, resource, accept):
+        """
+        Response body of a v2 API request answered by `resource`, whose
+        result is rendered as JSON the way Sileo does.
+        """
+        path = settings.POLLS_MSGPACK_PATH_PREFIXES[0] + 'question/question/get_pk/1/'
+        request = RequestFactory().get(path, HTTP_ACCEPT=accept)
+        return MessagePackMiddleware(lambda request: JsonResponse(resource(request)))(request).content
+
+    def document(self, size):
+        """
+        v1 document of a poll with `size` write-in choices.
+        """
+        return {
+            'id': 1,
+            'question_text': 'What should we build next?',
+            'pub_date': datetime.datetime(2024, 9, 3, 10, 56).isoformat(),
+            'closed_at': None,
+            'choices': [
+                serialize_choice(SimpleNamespace(id=index, choice_text='Write-in answer %d' % index, votes=index % 97))
+                for index in range(1, size + 1)
+            ],
+            'has_more_choices': False,
+        }
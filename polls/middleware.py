@@ -0,0 +1,132 @@
+import cProfile
+import json
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from . import profiling, querylog
+
+try:
+    import msgpack
+except ImportError:  # MessagePack support is optional
+    msgpack = None
+
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack')
+ACCEPTED_CONTENT_TYPES = ('application/json',) + MSGPACK_CONTENT_TYPES
+
+# Since Python 3.12 only one cProfile profiler can be active per process
+_profiling_lock = threading.Lock()
+
+
+class MessagePackMiddleware:
+    """
+    Answer the v2 API as MessagePack for clients that prefer it, e.g. with
+    `Accept: application/msgpack`.
+
+    v2 resources hand their document over through
+    `request.msgpack_response` (see polls.wire.response_v2) and it is packed
+    as is; other JSON responses, such as errors, are re-encoded. Only
+    applies under the POLLS_MSGPACK_PATH_PREFIXES paths, and only when the
+    `msgpack` package is installed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if msgpack is None or not request.path.startswith(tuple(settings.POLLS_MSGPACK_PATH_PREFIXES)):
+            return self.get_response(request)
+
+        # Weighed by q-value: `application/msgpack;q=0` means JSON
+        wants_msgpack = request.get_preferred_type(ACCEPTED_CONTENT_TYPES) in MSGPACK_CONTENT_TYPES
+        if wants_msgpack:
+            request.msgpack_response = {}
+        response = self.get_response(request)
+        patch_vary_headers(response, ['Accept'])
+        if not wants_msgpack or response.streaming:
+            return response
+
+        if 'document' in request.msgpack_response:
+            document = request.msgpack_response['document']
+        elif response.get('Content-Type', '').startswith('application/json'):
+            document = json.loads(response.content)
+        else:
+            return response
+
+        response.content = msgpack.packb(document, use_bin_type=True)
+        response['Content-Type'] = 'application/msgpack'
+        # CommonMiddleware, further in, already measured the JSON body
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = str(len(response.content))
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile opted-in API requests, see polls/profiling.py. Keep it last
+    in MIDDLEWARE so the capture is about the resource dispatch.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = profiling.profiling_settings()
+        if not options['ENABLED'] or not request.path.startswith(tuple(options['PATH_PREFIXES'])):
+            return self.get_response(request)
+
+        token = request.headers.get(options['HEADER'])
+        selected = (
+            profiling.valid_token(token, options['TOKEN_MAX_AGE']) if token
+            else random.random() < options['SAMPLE_RATE']
+        )
+        # Requests arriving while another one is profiled are served as is
+        if not selected or not _profiling_lock.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Some other profiling tool is active in this process
+                return self.get_response(request)
+            started = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                profile.disable()
+            duration_ms = (time.perf_counter() - started) * 1000
+        finally:
+            _profiling_lock.release()
+
+        if duration_ms >= options['THRESHOLD_MS']:
+            profiling.save(profile, request, duration_ms, profiling.capture_dir(options), options['KEEP'])
+        return response
+
+
+class SlowQueryMiddleware:
+    """
+    Log the slow queries API requests run on the polls databases (the
+    `default` connection and any shard), see polls/querylog.py.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = querylog.slow_query_settings()
+        if not options['ENABLED'] or not request.path.startswith(tuple(options['PATH_PREFIXES'])):
+            return self.get_response(request)
+
+        resource, method = profiling.describe(request)
+        wrapper = querylog.SlowQueryLogger(resource, method, options['THRESHOLD_MS'], options['EXPLAIN'])
+        with ExitStack() as stack:
+            for alias in settings.POLLS_SHARDS:
+                stack.enter_context(connections[alias].execute_wrapper(wrapper))
+            return self.get_response(request)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0002_questionsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='date closed'),
+        ),
+    ]
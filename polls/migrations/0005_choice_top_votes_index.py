@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0004_queuedtask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='choice',
+            index=models.Index(fields=['question', '-votes', 'id'], name='polls_choice_top_votes'),
+        ),
+    ]
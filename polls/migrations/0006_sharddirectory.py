@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0005_choice_top_votes_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardDirectory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('question', 'Question'), ('choice', 'Choice'), ('reserved', 'Reserved')], default='question', max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('question_id', models.BigIntegerField(db_index=True, null=True)),
+                ('shard', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name_plural': 'shard directory',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='polls_shard_directory_object')],
+            },
+        ),
+    ]
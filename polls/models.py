@@ -6,9 +6,17 @@ from django.utils import timezone
 class Question(models.Model):
     question_text = models.CharField(max_length=200)
     pub_date = models.DateTimeField('date published')
+    closed_at = models.DateTimeField('date closed', null=True, blank=True)
     
     def __str__(self):
         return self.question_text
+
+    @property
+    def is_closed(self):
+        """
+        Closed polls accept no more votes and their results never change.
+        """
+        return self.closed_at is not None
     
     def was_published_recently(self):
         now = timezone.now()
@@ -22,6 +30,78 @@ class Choice(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='choices')
     choice_text = models.CharField(max_length=200)
     votes = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Top choices by votes, and cursor pagination over them
+            models.Index(fields=['question', '-votes', 'id'], name='polls_choice_top_votes'),
+        ]
     
     def __str__(self):
-        return self.choice_text
\ No newline at end of file
+        return self.choice_text
+
+class QuestionSnapshot(models.Model):
+    """
+    Read model holding the serialized result document of a question,
+    pre-encoded as JSON bytes. Kept in sync by the write methods in
+    api_sileo.py and by the admin, see polls.snapshots.
+    """
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    pub_date = models.DateTimeField()
+    payload = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'Snapshot of question %s' % self.question_id
+
+
+class QueuedTask(models.Model):
+    """
+    Durable record of a background task, deleted once it succeeds.
+    See polls.tasks.
+    """
+    key = models.CharField(max_length=200)
+    func = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+
+class ShardDirectory(models.Model):
+    """
+    Hands out question and choice IDs when polls are sharded and records
+    which database holds each of them. Lives on `default`, see
+    polls.sharding.
+
+    Entries are keyed by kind and object ID: questions and choices created
+    before sharding come from separate sequences and share IDs. The
+    entry's own `id` is the sequence new IDs are taken from.
+    """
+    QUESTION = 'question'
+    CHOICE = 'choice'
+    # Marks the high-water mark of adopted IDs, see sharding.reserve_ids
+    RESERVED = 'reserved'
+    KIND_CHOICES = [
+        (QUESTION, 'Question'),
+        (CHOICE, 'Choice'),
+        (RESERVED, 'Reserved'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=QUESTION)
+    object_id = models.BigIntegerField()
+    question_id = models.BigIntegerField(null=True, db_index=True)
+    shard = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name_plural = 'shard directory'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='polls_shard_directory_object'),
+        ]
+
+    def __str__(self):
+        return '%s %s on %s' % (self.kind, self.object_id, self.shard)
@@ -0,0 +1,157 @@
+"""
+Opt-in cProfile capture of slow API requests.
+
+When POLLS_PROFILING['ENABLED'] is set, polls.middleware.ProfilingMiddleware
+runs a request under cProfile if it carries a valid signed profiling header
+(see `manage.py profiling_token`) or is picked by SAMPLE_RATE. Requests slower
+than THRESHOLD_MS are saved to DIR as a `.pstats` file named after the
+resource, method and duration. Only the newest KEEP captures are kept.
+
+`manage.py profiling_collapse` turns the captures into `.collapsed` files of
+folded stacks ready for flamegraph.pl or speedscope. Rebuilding the call
+chains takes seconds on large profiles, so it is kept off the request.
+"""
+import os
+import pstats
+import re
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.0,
+    'HEADER': 'X-Polls-Profile',
+    'TOKEN_MAX_AGE': 24 * 60 * 60,
+    'THRESHOLD_MS': 200,
+    'DIR': None,
+    'KEEP': 200,
+    'PATH_PREFIXES': ['/api-sileo/'],
+}
+
+TOKEN_SALT = 'polls.profiling'
+TOKEN_VALUE = 'profile'
+
+# Deepest call chain written to the folded stacks
+MAX_STACK_DEPTH = 64
+
+# Call chains carrying less than this share of a function's time are dropped
+MIN_PATH_WEIGHT = 0.001
+
+
+def profiling_settings():
+    """
+    POLLS_PROFILING merged over the defaults.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_PROFILING', {})}
+
+
+def make_token():
+    """
+    Signed value of the profiling header, valid for TOKEN_MAX_AGE seconds.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def valid_token(token, max_age):
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age) == TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+def frame_label(func):
+    filename, line, name = func
+    if filename == '~':
+        # Built-in functions
+        return name
+    return '%s:%d:%s' % (os.path.basename(filename), line, name)
+
+
+def folded_stacks(stats):
+    """
+    Rebuild folded stacks (`root;...;leaf microseconds` lines) from the
+    caller graph of a pstats.Stats. cProfile only records caller/callee
+    pairs, so the own time of a function is split across its call chains in
+    proportion to the time each caller spent in it.
+    """
+    entries = stats.stats
+    lines = {}
+
+    def chains(func, path, weight):
+        # Yield (chain from the root down to `func`, share of its time)
+        callers = {caller: caller_stats for caller, caller_stats in entries[func][4].items()
+                   if caller in entries and caller not in path}
+        if not callers or len(path) >= MAX_STACK_DEPTH:
+            yield (func,), weight
+            return
+        total = sum(caller_stats[3] for caller_stats in callers.values())
+        for caller, caller_stats in callers.items():
+            share = weight * (caller_stats[3] / total if total else 1 / len(callers))
+            if share < MIN_PATH_WEIGHT:
+                continue
+            for chain, chain_weight in chains(caller, path | {caller}, share):
+                yield chain + (func,), chain_weight
+
+    for func, (_, _, own_time, _, _) in entries.items():
+        if own_time <= 0:
+            continue
+        for chain, weight in chains(func, frozenset([func]), 1.0):
+            micros = int(own_time * weight * 1e6)
+            if micros:
+                line = ';'.join(frame_label(frame) for frame in chain)
+                lines[line] = lines.get(line, 0) + micros
+    return ['%s %d' % item for item in sorted(lines.items())]
+
+
+def capture_dir(options):
+    return Path(options['DIR'] or Path(settings.BASE_DIR) / 'profiles')
+
+
+def collapse(path):
+    """
+    Write the folded stacks of a saved `.pstats` capture next to it.
+    """
+    path = Path(path)
+    collapsed = path.with_suffix('.collapsed')
+    collapsed.write_text('\n'.join(folded_stacks(pstats.Stats(str(path)))) + '\n')
+    return collapsed
+
+
+def describe(request):
+    """
+    Resource and method names of an API request, for file names.
+    """
+    match = getattr(request, 'resolver_match', None)
+    kwargs = match.kwargs if match else {}
+    resource = kwargs.get('name') or kwargs.get('namespace')
+    method = kwargs.get('method')
+    if not (resource and method):
+        segments = [segment for segment in request.path.split('/') if segment]
+        # /api-sileo/<version>/<namespace>/<name>/<method>/...
+        resource = resource or (segments[3] if len(segments) > 3 else 'unknown')
+        method = method or (segments[4] if len(segments) > 4 else request.method.lower())
+    return [re.sub(r'[^A-Za-z0-9_-]', '_', str(part)) for part in (resource, method)]
+
+
+def save(profile, request, duration_ms, directory, keep):
+    """
+    Write the capture of one request and rotate old captures out.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    resource, method = describe(request)
+    stem = directory / ('%s-%d-%s-%s-%dms' % (
+        time.strftime('%Y%m%dT%H%M%S'), os.getpid(), resource, method, duration_ms
+    ))
+
+    pstats.Stats(profile).dump_stats('%s.pstats' % stem)
+
+    captures = sorted(directory.glob('*.pstats'), key=lambda path: path.stat().st_mtime, reverse=True)
+    for old in captures[keep:]:
+        old.unlink(missing_ok=True)
+        old.with_suffix('.collapsed').unlink(missing_ok=True)
+    return stem
+
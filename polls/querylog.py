@@ -0,0 +1,129 @@
+"""
+Slow query log.
+
+polls.middleware.SlowQueryMiddleware installs SlowQueryLogger as an
+execution wrapper on the polls databases for every API request. Queries
+slower than POLLS_SLOW_QUERIES['THRESHOLD_MS'] are appended as JSON lines
+to LOG_FILE, with the resource and method that issued them. The first time
+a worker sees a query shape it also records its `EXPLAIN QUERY PLAN` and
+flags full table scans and temporary sort trees. `manage.py slow_queries`
+summarizes the log.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'THRESHOLD_MS': 100,
+    'LOG_FILE': None,
+    'EXPLAIN': True,
+    'PATH_PREFIXES': ['/api-sileo/'],
+}
+
+_explained = set()
+_state = threading.local()
+_write_lock = threading.Lock()
+
+
+def slow_query_settings():
+    """
+    POLLS_SLOW_QUERIES merged over the defaults.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_SLOW_QUERIES', {})}
+
+
+def log_file():
+    return Path(slow_query_settings()['LOG_FILE'] or Path(settings.BASE_DIR) / 'slow_queries.jsonl')
+
+
+def query_shape(sql):
+    """
+    Normalize a query so that runs differing only by the number of IN
+    parameters or literal numbers (such as LIMIT) group together.
+    """
+    shape = re.sub(r'\s+', ' ', sql).strip()
+    shape = re.sub(r'IN \((?:%s, )*%s\)', 'IN (...)', shape)
+    return re.sub(r'(?<![\w"])\d+\b', '?', shape)
+
+
+def plan_flags(plan):
+    """
+    Problems spotted in SQLite query plan details.
+    """
+    flags = []
+    for detail in plan:
+        scan = re.match(r'SCAN (?:TABLE )?(\S+)', detail)
+        if scan and 'USING' not in detail:
+            flags.append('full table scan of %s' % scan.group(1))
+        if detail.startswith('USE TEMP B-TREE'):
+            flags.append(detail.lower())
+    return flags
+
+
+class SlowQueryLogger:
+    """
+    Database execution wrapper logging the slow queries of one request.
+    """
+
+    def __init__(self, resource, method, threshold_ms, explain=True):
+        self.resource = resource
+        self.method = method
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_state, 'explaining', False):
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= self.threshold_ms:
+            self.record(sql, params, many, context['connection'], duration_ms)
+        return result
+
+    def record(self, sql, params, many, connection, duration_ms):
+        shape = query_shape(sql)
+        entry = {
+            'time': time.time(),
+            'database': connection.alias,
+            'resource': self.resource,
+            'method': self.method,
+            'duration_ms': round(duration_ms, 3),
+            'shape': shape,
+        }
+        if self.explain and not many and shape not in _explained and connection.vendor == 'sqlite':
+            _explained.add(shape)
+            entry['plan'] = self.query_plan(sql, params, connection)
+            entry['flags'] = plan_flags(entry['plan'])
+
+        logger.warning('Slow query (%.1f ms) in %s.%s: %s', duration_ms, self.resource, self.method, shape)
+        line = json.dumps(entry) + '\n'
+        with _write_lock, log_file().open('a') as log:
+            log.write(line)
+
+    def query_plan(self, sql, params, connection):
+        """
+        `EXPLAIN QUERY PLAN` details of a query, without logging the EXPLAIN
+        itself.
+        """
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return []
+        _state.explaining = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return [row[-1] for row in cursor.fetchall()]
+        except Exception:
+            logger.exception('Could not explain %s', sql)
+            return []
+        finally:
+            _state.explaining = False
@@ -0,0 +1,31 @@
+from django.conf import settings
+
+# Polls models spread over POLLS_SHARDS, see polls.sharding. Every other
+# model lives on the `default` database only.
+SHARDED_MODELS = {'question', 'choice', 'questionsnapshot'}
+
+
+class ShardRouter:
+    """
+    Keep polls rows on the shard they were loaded from.
+
+    Code reaching for a specific poll picks its shard explicitly with
+    `.using()`; the router makes related lookups, saves and deletes follow
+    the instance they start from.
+    """
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'polls' and model_name in SHARDED_MODELS:
+            return db in settings.POLLS_SHARDS
+        return db == 'default'
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db import router
+
+from .models import Choice
+
+# Question payloads list the most voted choices first, ties by creation order
+CHOICE_ORDERING = ('-votes', 'id')
+
+
+def choices_per_question():
+    """
+    Number of choices embedded in a question payload.
+    """
+    return settings.POLLS_CHOICES_PER_QUESTION
+
+
+def top_choices(question):
+    """
+    Load the choices embedded in the payload of one question, plus one to
+    tell whether there are more.
+    """
+    return question.choices.order_by(*CHOICE_ORDERING)[:choices_per_question() + 1]
+
+
+def top_choices_in_bulk(question_ids, using=None):
+    """
+    Load the choices embedded in the payloads of several questions with a
+    single query on database `using`, grouped by question ID, plus one per
+    question to tell whether there are more.
+
+    The query is a UNION ALL of one top_choices() query per question, so
+    each question costs an index range scan that stops after K+1 rows
+    however many choices it has.
+    """
+    choices_by_question = {question_id: [] for question_id in question_ids}
+    if not choices_by_question:
+        return choices_by_question
+
+    db = using or router.db_for_read(Choice)
+    parts, params = [], []
+    for question_id in choices_by_question:
+        queryset = Choice.objects.using(db).filter(
+            question_id=question_id
+        ).order_by(*CHOICE_ORDERING)[:choices_per_question() + 1]
+        sql, part_params = queryset.query.get_compiler(db).as_sql()
+        # Subqueries keep their own ORDER BY and LIMIT, SQLite included
+        parts.append('SELECT * FROM (%s)' % sql)
+        params.extend(part_params)
+    for choice in Choice.objects.using(db).raw(' UNION ALL '.join(parts), params):
+        choices_by_question[choice.question_id].append(choice)
+    return choices_by_question
+
+
+def serialize_choice(choice):
+    """
+    Serialize a Choice object into a dictionary.
+    """
+    return {
+        'id': choice.id,
+        'choice_text': choice.choice_text,
+        'votes': choice.votes,
+    }
+
+
+def serialize_question(question, choices=None):
+    """
+    Serialize a Question object into a dictionary.
+
+    Only the top POLLS_CHOICES_PER_QUESTION choices by votes are embedded,
+    `has_more_choices` tells clients to page through ChoiceResource.page
+    for the rest. `choices` may be passed in when they were already loaded
+    in bulk, see top_choices_in_bulk.
+    """
+    if choices is None:
+        choices = top_choices(question)
+    choices = list(choices)
+    limit = choices_per_question()
+    return {
+        'id': question.id,
+        'question_text': question.question_text,
+        'pub_date': question.pub_date.isoformat(),  # Format date as ISO string
+        'closed_at': question.closed_at.isoformat() if question.closed_at else None,
+        'choices': [serialize_choice(choice) for choice in choices[:limit]],
+        'has_more_choices': len(choices) > limit,
+    }
@@ -0,0 +1,163 @@
+"""
+Horizontal sharding of polls across several databases.
+
+A question and all of its choices and its snapshot live together on one of
+the POLLS_SHARDS databases. When there is more than one shard, question and
+choice IDs are handed out by the ShardDirectory table on the `default`
+database, which also records the shard of every question and choice:
+locating either is one lookup on (kind, ID), and `manage.py
+rebalance_shards` moves a poll by copying its rows and flipping its
+directory entries.
+
+With a single shard everything stays on `default` and none of this costs a
+query.
+"""
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import Max
+
+from .models import ShardDirectory
+
+DIRECTORY_DATABASE = 'default'
+
+QUESTION = ShardDirectory.QUESTION
+CHOICE = ShardDirectory.CHOICE
+
+
+class DirectoryConflict(Exception):
+    """
+    A question or choice ID is already registered for another poll.
+    """
+
+
+def shards():
+    """
+    Aliases of the databases polls are spread over.
+    """
+    return settings.POLLS_SHARDS
+
+
+def is_sharded():
+    return len(shards()) > 1
+
+
+def home_shard(object_id):
+    """
+    Shard a question is placed on when created, from its ID.
+    """
+    return shards()[int(object_id) % len(shards())]
+
+
+def directory():
+    return ShardDirectory.objects.using(DIRECTORY_DATABASE)
+
+
+def shard_for(object_id, kind=QUESTION):
+    """
+    Database holding the question, or with `kind=CHOICE` the choice, with
+    this ID. IDs unknown to the directory, such as rows created before
+    sharding was enabled, are looked up on `default`.
+    """
+    if not is_sharded():
+        return DIRECTORY_DATABASE
+    try:
+        shard = directory().filter(
+            kind=kind, object_id=int(object_id)
+        ).values_list('shard', flat=True).first()
+    except (TypeError, ValueError):
+        return DIRECTORY_DATABASE
+    return shard or DIRECTORY_DATABASE
+
+
+def shards_for(question_ids):
+    """
+    Map several question IDs to their databases with a single directory
+    query.
+    """
+    if not is_sharded():
+        return {question_id: DIRECTORY_DATABASE for question_id in question_ids}
+    found = dict(directory().filter(
+        kind=QUESTION, object_id__in=list(question_ids)
+    ).values_list('object_id', 'shard'))
+    return {question_id: found.get(question_id, DIRECTORY_DATABASE) for question_id in question_ids}
+
+
+def allocate_question():
+    """
+    Reserve the ID and the shard of a new question. The ID is None when
+    polls aren't sharded, leaving it to the database.
+    """
+    if not is_sharded():
+        return None, DIRECTORY_DATABASE
+    with transaction.atomic(using=DIRECTORY_DATABASE):
+        entry = directory().create(kind=QUESTION, object_id=0, shard='')
+        entry.object_id = entry.question_id = entry.id
+        entry.shard = home_shard(entry.id)
+        entry.save(using=DIRECTORY_DATABASE, update_fields=['object_id', 'question_id', 'shard'])
+    return entry.id, entry.shard
+
+
+def allocate_choice(question):
+    """
+    Reserve the ID of a new choice of `question`, on the question's shard.
+    """
+    if not is_sharded():
+        return None
+    with transaction.atomic(using=DIRECTORY_DATABASE):
+        entry = directory().create(kind=CHOICE, object_id=0, question_id=question.id, shard=question._state.db)
+        entry.object_id = entry.id
+        entry.save(using=DIRECTORY_DATABASE, update_fields=['object_id'])
+    return entry.id
+
+
+def forget(object_id, kind=QUESTION):
+    """
+    Drop the directory entries of a deleted question and its choices, or
+    with `kind=CHOICE` of a deleted choice.
+    """
+    if not is_sharded():
+        return
+    if kind == QUESTION:
+        directory().filter(question_id=object_id).delete()
+    else:
+        directory().filter(kind=kind, object_id=object_id).delete()
+
+
+def place(question_id, choice_ids, shard):
+    """
+    Record that a question and its choices live on `shard`, replacing its
+    previous entries. Raise DirectoryConflict when one of these IDs is
+    registered for another poll.
+    """
+    keys = [(QUESTION, question_id)] + [(CHOICE, choice_id) for choice_id in choice_ids]
+    with transaction.atomic(using=DIRECTORY_DATABASE):
+        entries = directory().select_for_update().exclude(question_id=question_id)
+        for kind, object_ids in ((QUESTION, [question_id]), (CHOICE, list(choice_ids))):
+            taken = list(entries.filter(kind=kind, object_id__in=object_ids).values_list('object_id', 'question_id'))
+            if taken:
+                raise DirectoryConflict('%s %d already belongs to question %s.' % (kind.capitalize(), *taken[0]))
+
+        directory().filter(question_id=question_id).delete()
+        directory().bulk_create([
+            ShardDirectory(kind=kind, object_id=object_id, question_id=question_id, shard=shard)
+            for kind, object_id in keys
+        ])
+        reserve_ids(max(object_id for _, object_id in keys))
+
+
+def reserve_ids(up_to):
+    """
+    Move the directory's ID sequence past `up_to`, so that IDs adopted from
+    before sharding are never handed out again.
+    """
+    last = directory().aggregate(last=Max('id'))['last'] or 0
+    if last >= up_to:
+        return
+    directory().filter(kind=ShardDirectory.RESERVED).delete()
+    directory().create(id=up_to, kind=ShardDirectory.RESERVED, object_id=up_to, shard='')
+    # Backends with sequences don't advance them on explicit IDs
+    connection = connections[DIRECTORY_DATABASE]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [ShardDirectory]):
+            cursor.execute(sql)
@@ -0,0 +1,152 @@
+"""
+Single-flight coalescing of identical concurrent reads.
+
+When many requests ask for the same thing at once, typically right after a
+popular question's cache entry expired, only the first one computes the
+response: the others wait for it and share its result. Within a worker this
+is a lock and an event per in-flight key. With POLLS_SINGLE_FLIGHT
+['CROSS_WORKER'] the first worker also takes a lock in the cache backend
+and publishes its result there briefly, so workers sharing that cache
+coalesce as well.
+"""
+import copy
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CROSS_WORKER': False,
+    # Seconds a cross-worker leader may hold the lock, and followers wait
+    'LOCK_TIMEOUT': 5,
+    # Seconds a cross-worker result stays available to followers
+    'RESULT_TIMEOUT': 1,
+    'POLL_INTERVAL': 0.01,
+}
+
+
+def single_flight_settings():
+    """
+    POLLS_SINGLE_FLIGHT merged over the defaults.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_SINGLE_FLIGHT', {})}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time in this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """
+        Return `func()`, or the result of the identical call already in
+        flight. Exceptions are shared the same way. When the result is
+        shared every caller gets its own copy, so that none of them can
+        change what another one is still sending.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        # Followers can no longer join once the call is out of _calls
+        return copy.deepcopy(call.result) if call.waiters else call.result
+
+
+def across_workers(key, func, options):
+    """
+    Coalesce `func()` with the other workers through the cache backend.
+    Followers poll for the leader's result and compute it themselves if
+    it doesn't show up before LOCK_TIMEOUT.
+    """
+    # Keep keys short and free of characters some backends reject
+    digest = hashlib.sha1(key.encode()).hexdigest()
+    lock_key = 'polls:flight:lock:%s' % digest
+    result_key = 'polls:flight:result:%s' % digest
+
+    if not cache.add(lock_key, 1, options['LOCK_TIMEOUT']):
+        deadline = time.monotonic() + options['LOCK_TIMEOUT']
+        while time.monotonic() < deadline:
+            result = cache.get(result_key)
+            if result is not None:
+                return result
+            if cache.get(lock_key) is None:
+                # The leader finished or failed, its result may just be in
+                result = cache.get(result_key)
+                return func() if result is None else result
+            time.sleep(options['POLL_INTERVAL'])
+        return func()
+
+    try:
+        result = func()
+        cache.set(result_key, result, options['RESULT_TIMEOUT'])
+        return result
+    finally:
+        cache.delete(lock_key)
+
+
+flights = SingleFlight()
+
+
+def coalesce(method):
+    """
+    Decorate a read method of a Sileo resource so that concurrent
+    identical requests (same resource, method, arguments, HTTP method,
+    query string and body) share one computation.
+    """
+    @functools.wraps(method)
+    def wrapper(self, **kwargs):
+        options = single_flight_settings()
+        if not options['ENABLED']:
+            return method(self, **kwargs)
+
+        key = '%s.%s:%s:%s:%s:%s' % (
+            type(self).__name__, method.__name__,
+            sorted((name, str(value)) for name, value in kwargs.items()),
+            self.request.method,
+            self.request.GET.urlencode(),
+            # get_many can read its IDs from the body
+            hashlib.sha1(self.request.body).hexdigest() if self.request.body else '',
+        )
+
+        def compute():
+            return method(self, **kwargs)
+
+        if options['CROSS_WORKER']:
+            return flights.do(key, lambda: across_workers(key, compute, options))
+        return flights.do(key, compute)
+    return wrapper
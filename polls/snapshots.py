@@ -0,0 +1,164 @@
+"""
+Materialized result documents for questions.
+
+Every write that changes what a question looks like refreshes its
+QuestionSnapshot inside the same transaction, so reads are a single primary
+key lookup returning ready-to-send JSON bytes. The API resources and the
+admin (see polls/admin.py) do so; code writing questions or choices any
+other way, such as a shell session, must call refresh() itself. Questions
+without a snapshot are built on first access by get_pk and get_many, but
+are left out of filter until then; `manage.py refresh_snapshots` builds
+them all.
+
+When the `default` cache is shared by all workers (see CACHES), payloads
+are also kept there for POLLS_SNAPSHOT_CACHE_TIMEOUT seconds, replaced
+whenever the snapshot is refreshed, and preloaded for the hottest questions
+by polls.hotness. A per-process cache would keep serving old votes from
+the workers that didn't handle the write, so it is not used.
+
+Closed polls never change again: their final document is also written to a
+static file under POLLS_CLOSED_RESULTS_DIR, served without touching the
+database.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import sharding, tasks
+from .models import Question, QuestionSnapshot
+from .serializer import serialize_question
+
+
+# Cache backends whose entries the other workers can't see
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_enabled():
+    """
+    Whether payloads are cached: only in a cache shared by the workers.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    return bool(settings.POLLS_SNAPSHOT_CACHE_TIMEOUT) and backend not in LOCAL_CACHE_BACKENDS
+
+
+def cache_key(question_id):
+    return 'polls:question:%s' % question_id
+
+
+def encode(document):
+    """
+    Encode a result document the way it is stored and served.
+    """
+    return json.dumps(document, separators=(',', ':')).encode('utf-8')
+
+
+def refresh(question, choices=None):
+    """
+    Rebuild and store the snapshot of `question` (an instance or an ID) on
+    the question's shard. Call it inside the transaction of the write that
+    changed the question. `choices` may be passed in when its top choices
+    were already loaded in bulk. Return the encoded payload.
+    """
+    if not isinstance(question, Question):
+        question = Question.objects.using(sharding.shard_for(question)).get(pk=question)
+    payload = encode(serialize_question(question, choices))
+    QuestionSnapshot.objects.using(question._state.db).update_or_create(
+        question=question,
+        defaults={'pub_date': question.pub_date, 'payload': payload},
+    )
+
+    # Only published questions may be answered from the cache
+    key = cache_key(question.id)
+    if cache_enabled() and question.pub_date <= timezone.now():
+        transaction.on_commit(
+            lambda: cache.set(key, payload, settings.POLLS_SNAPSHOT_CACHE_TIMEOUT), using=question._state.db
+        )
+    elif cache_enabled():
+        transaction.on_commit(lambda: cache.delete(key), using=question._state.db)
+    return payload
+
+
+def refresh_after_vote(question):
+    """
+    Refresh the snapshot of a question instance after a vote: inline, or
+    on the background task executor once the vote commits when
+    POLLS_TASKS['ASYNC_SNAPSHOTS'] is set. Votes arriving before the task
+    runs are folded into a single refresh.
+    """
+    if not tasks.task_settings()['ASYNC_SNAPSHOTS']:
+        refresh(question)
+        return
+    tasks.enqueue_on_commit('snapshot:%s' % question.id, refresh, question.id, using=question._state.db)
+
+
+def load(question_id):
+    """
+    Return the stored payload of a published question, from the cache when
+    possible, or None when the question has no snapshot yet or isn't
+    published.
+    """
+    key = cache_key(question_id)
+    payload = cache.get(key) if cache_enabled() else None
+    if payload is not None:
+        return payload
+
+    payload = QuestionSnapshot.objects.using(sharding.shard_for(question_id)).filter(
+        pk=question_id, pub_date__lte=timezone.now()
+    ).values_list('payload', flat=True).first()
+    if payload is None:
+        return None
+    payload = bytes(payload)
+    if cache_enabled():
+        # A refresh that committed since the row was read has already
+        # stored a newer payload, don't overwrite it
+        cache.add(key, payload, settings.POLLS_SNAPSHOT_CACHE_TIMEOUT)
+    return payload
+
+
+def closed_path(question_id):
+    """
+    Location of the static results file of a closed question.
+    """
+    return Path(settings.POLLS_CLOSED_RESULTS_DIR) / ('%d.json' % int(question_id))
+
+
+def write_closed(question_id, payload):
+    """
+    Publish the final results of a closed question. The file is written
+    aside and renamed into place so readers never see a partial document.
+    """
+    path = closed_path(question_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp_file:
+        tmp_file.write(payload)
+    os.replace(tmp_path, path)
+
+
+def discard(question_id):
+    """
+    Forget the cached payload and the static results file, if any, of a
+    deleted question.
+    """
+    cache.delete(cache_key(question_id))
+    closed_path(question_id).unlink(missing_ok=True)
+
+
+def load_closed(question_id):
+    """
+    Return the final results of a closed question, or None when the question
+    isn't closed.
+    """
+    try:
+        return closed_path(question_id).read_bytes()
+    except (FileNotFoundError, ValueError):
+        return None
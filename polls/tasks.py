@@ -0,0 +1,216 @@
+"""
+In-process background tasks for work that follows a request, such as
+refreshing aggregates after a vote.
+
+Each worker process owns a bounded thread pool. Tasks carry a key: a task
+enqueued while another one with the same key is still waiting is folded
+into it, so a burst of votes on one question costs a single refresh. Runs
+of one key never overlap: a task enqueued while its key runs is run once
+more after that run, since it may carry changes the run didn't see. Failed
+tasks are retried with a growing delay, and the pool is drained when the
+process exits. With POLLS_TASKS['PERSISTENT'] each task is also recorded in
+the QueuedTask table until it succeeds; `manage.py run_queued_tasks`
+replays whatever a crashed worker left behind.
+
+Task functions must be importable module-level callables taking JSON
+serializable arguments.
+"""
+import atexit
+import importlib
+import logging
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_WORKERS': 2,
+    'MAX_PENDING': 1000,
+    'MAX_RETRIES': 3,
+    'RETRY_DELAY': 0.5,
+    'PERSISTENT': False,
+    'ASYNC_SNAPSHOTS': False,
+}
+
+
+def task_settings():
+    """
+    POLLS_TASKS merged over the defaults.
+    """
+    return {**DEFAULTS, **getattr(settings, 'POLLS_TASKS', {})}
+
+
+def task_path(func):
+    return '%s.%s' % (func.__module__, func.__qualname__)
+
+
+def import_task(path):
+    module_name, _, func_name = path.rpartition('.')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class TaskExecutor:
+    """
+    Bounded thread pool running keyed tasks with coalescing and retries.
+    """
+
+    def __init__(self, max_workers=2, max_pending=1000, max_retries=3, retry_delay=0.5, persistent=False):
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.persistent = persistent
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='polls-task')
+        self._pending = set()
+        self._running = set()
+        # Task to run again after the current run of its key
+        self._reruns = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def enqueue(self, key, func, *args, **kwargs):
+        """
+        Schedule `func(*args, **kwargs)` and return immediately. Return False
+        when an identical key was already waiting and the task was folded
+        into it. A task whose key is running is scheduled to run after it.
+        When the queue is full the task runs in the caller.
+        """
+        # Recorded up front so that a rerun never starts without its record
+        record_id = self.record(key, func, args, kwargs) if self.persistent else None
+        with self._lock:
+            folded = key in self._pending or key in self._reruns
+            rerun = not folded and key in self._running
+            run_inline = self._closed or len(self._pending) >= self.max_pending
+            if rerun:
+                self._reruns[key] = (func, args, kwargs, record_id)
+            elif not folded:
+                (self._running if run_inline else self._pending).add(key)
+
+        if folded:
+            if record_id is not None:
+                from .models import QueuedTask
+                QueuedTask.objects.filter(pk=record_id).delete()
+            return False
+        if rerun:
+            return True
+        if run_inline:
+            logger.warning('Task queue unavailable or full, running %s inline', key)
+            self.run_key(key, func, args, kwargs, record_id)
+        else:
+            self._pool.submit(self.run_key, key, func, args, kwargs, record_id, True)
+        return True
+
+    def run_key(self, key, func, args, kwargs, record_id=None, pooled=False):
+        """
+        Run a task, then the reruns enqueued meanwhile under its key.
+        """
+        if pooled:
+            # Enqueues from now on wait for this run to finish
+            with self._lock:
+                self._pending.discard(key)
+                self._running.add(key)
+        while True:
+            self.run(key, func, args, kwargs, record_id, pooled)
+            with self._lock:
+                rerun = self._reruns.pop(key, None)
+                if rerun is None:
+                    self._running.discard(key)
+                    return
+            func, args, kwargs, record_id = rerun
+
+    def run(self, key, func, args, kwargs, record_id=None, pooled=False):
+        """
+        Run one task with retries, in a pool thread or inline.
+        """
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    if attempt == self.max_retries:
+                        logger.exception('Task %s failed after %d attempts', key, attempt + 1)
+                        if record_id is not None:
+                            self.record_failure(record_id, attempt + 1)
+                        return
+                    logger.warning('Task %s failed, retrying', key, exc_info=True)
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                else:
+                    if record_id is not None:
+                        from .models import QueuedTask
+                        QueuedTask.objects.filter(pk=record_id).delete()
+                    return
+        finally:
+            if pooled:
+                # Pool threads outlive the request, don't leak their connections
+                connections.close_all()
+
+    def record(self, key, func, args, kwargs):
+        """
+        Persist a task so it survives a crash of this worker.
+        """
+        from .models import QueuedTask
+        return QueuedTask.objects.create(key=key, func=task_path(func), args=list(args), kwargs=kwargs).pk
+
+    def record_failure(self, record_id, attempts):
+        """
+        Keep a failed persistent task for run_queued_tasks, with its error.
+        """
+        from .models import QueuedTask
+        QueuedTask.objects.filter(pk=record_id).update(
+            attempts=F('attempts') + attempts, last_error=traceback.format_exc()
+        )
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting pooled work and wait for queued tasks to finish.
+        """
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=wait)
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Return this worker's executor, created on first use so that forked
+    workers each get their own threads.
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            options = task_settings()
+            _executor = TaskExecutor(
+                max_workers=options['MAX_WORKERS'],
+                max_pending=options['MAX_PENDING'],
+                max_retries=options['MAX_RETRIES'],
+                retry_delay=options['RETRY_DELAY'],
+                persistent=options['PERSISTENT'],
+            )
+            _executor_pid = os.getpid()
+            atexit.register(_executor.shutdown)
+        return _executor
+
+
+def enqueue(key, func, *args, **kwargs):
+    """
+    Schedule a task on this worker's executor.
+    """
+    return get_executor().enqueue(key, func, *args, **kwargs)
+
+
+def enqueue_on_commit(key, func, *args, using=None, **kwargs):
+    """
+    Schedule a task once the current transaction on database `using`
+    commits, so it sees the data written by the request.
+    """
+    transaction.on_commit(lambda: enqueue(key, func, *args, **kwargs), using=using)
@@ -1,11 +1,32 @@
 import datetime
+import json
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.utils import timezone
-from django.urls import reverse
+from django.urls import path, reverse
 
 
-from .models import Question
+from . import hotness, profiling, querylog, sharding, snapshots, wire
+from .api_sileo import ChoiceResource, QuestionResource, VotingResource
+from .models import Choice, Question, QuestionSnapshot
+from .serializer import top_choices_in_bulk
+from .hotness import CountMinSketch, HotTracker
+from .middleware import MessagePackMiddleware, ProfilingMiddleware, SlowQueryMiddleware, _profiling_lock, msgpack
+from .singleflight import SingleFlight, coalesce
+from .tasks import TaskExecutor
 
 
 class QuestionModelTests(TestCase):
@@ -123,4 +144,845 @@ class QuestionDetailViewTests(TestCase):
         past_question = create_question(question_text='Past Question.', days=-5)
         url = reverse('polls:detail', args=(past_question.id,))
         response = self.client.get(url)
-        self.assertContains(response, past_question.question_text)
\ No newline at end of file
+        self.assertContains(response, past_question.question_text)
+
+def make_resource(resource_class, request):
+    """
+    Build a Sileo resource bound to `request` so its methods can be
+    called directly.
+    """
+    resource = resource_class.__new__(resource_class)
+    resource.request = request
+    return resource
+
+
+class QuestionResourceGetManyTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        # Question IDs are reused between tests, cached payloads must not be
+        cache.clear()
+
+    def test_get_many_keeps_order_and_reports_missing(self):
+        """
+        get_many() returns the questions in the requested order, with their
+        choices, and lists IDs that don't exist or aren't published yet.
+        """
+        first = create_question(question_text='First.', days=-2)
+        second = create_question(question_text='Second.', days=-1)
+        future = create_question(question_text='Future.', days=5)
+        Choice.objects.create(question=first, choice_text='A')
+        Choice.objects.create(question=second, choice_text='B')
+        for question in (first, second, future):
+            snapshots.refresh(question)
+
+        ids = '%d,%d,%d,999' % (second.id, first.id, future.id)
+        resource = make_resource(QuestionResource, self.factory.get('/', {'ids': ids}))
+        # Snapshots, the questions missing one and the directory lookup
+        # when polls are sharded
+        with self.assertNumQueries(2 + sharding.is_sharded()):
+            response = resource.get_many()
+
+        self.assertEqual(response['status_code'], 200)
+        self.assertEqual([q['id'] for q in response['data']], [second.id, first.id])
+        self.assertEqual(response['data'][0]['choices'][0]['choice_text'], 'B')
+        self.assertEqual(response['missing'], [future.id, 999])
+
+    def test_get_many_builds_missing_snapshots(self):
+        """
+        Questions without a snapshot yet are served and get one.
+        """
+        question = create_question(question_text='Unbuilt.', days=-1)
+        Choice.objects.create(question=question, choice_text='A', votes=2)
+
+        resource = make_resource(QuestionResource, self.factory.get('/', {'ids': str(question.id)}))
+        response = resource.get_many()
+        self.assertEqual(response['data'][0]['choices'][0]['votes'], 2)
+        self.assertEqual(json.loads(snapshots.load(question.id)), response['data'][0])
+
+    def test_get_many_rejects_invalid_ids(self):
+        """
+        get_many() answers 400 when the IDs are missing or not numeric.
+        """
+        resource = make_resource(QuestionResource, self.factory.get('/', {'ids': '1,x'}))
+        self.assertEqual(resource.get_many()['status_code'], 400)
+
+
+class QuestionSnapshotTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def test_vote_refreshes_snapshot(self):
+        """
+        Voting rewrites the stored result document in the same transaction.
+        """
+        question = create_question(question_text='Snapshot question.', days=-1)
+        choice = Choice.objects.create(question=question, choice_text='A')
+        request = self.factory.post('/', '{"choice_id": %d}' % choice.id, content_type='application/json')
+        make_resource(VotingResource, request).create()
+
+        document = json.loads(snapshots.load(question.id))
+        self.assertEqual(document['choices'][0]['votes'], 1)
+
+    def test_results_view_serves_stored_bytes(self):
+        """
+        The results endpoint returns the snapshot bytes with one query.
+        """
+        question = create_question(question_text='Snapshot question.', days=-1)
+        payload = snapshots.refresh(question)
+        with self.assertNumQueries(1 + sharding.is_sharded()):
+            response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertEqual(response.content, payload)
+
+    def test_per_process_cache_is_not_used(self):
+        """
+        With a cache local to each worker, payloads are not cached: the
+        other workers would keep serving the old votes.
+        """
+        question = create_question(question_text='Snapshot question.', days=-1)
+        with self.captureOnCommitCallbacks(execute=True):
+            payload = snapshots.refresh(question)
+        self.assertEqual(snapshots.load(question.id), payload)
+        self.assertIsNone(cache.get(snapshots.cache_key(question.id)))
+
+    def test_load_keeps_payload_stored_meanwhile(self):
+        """
+        A read that loaded the snapshot row before a refresh committed
+        doesn't overwrite the refreshed payload in a shared cache.
+        """
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        shared = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir.name,
+        }}
+        question = create_question(question_text='Snapshot question.', days=-1)
+        snapshots.refresh(question)
+        key = snapshots.cache_key(question.id)
+
+        def refresh_commits(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            cache.set(key, b'refreshed')
+            return result
+
+        with override_settings(CACHES=shared):
+            with connection.execute_wrapper(refresh_commits):
+                self.assertNotEqual(snapshots.load(question.id), b'refreshed')
+            self.assertEqual(cache.get(key), b'refreshed')
+
+    def test_filter_serves_snapshots(self):
+        """
+        filter() answers from the stored documents, newest first, without
+        reading questions or choices.
+        """
+        older = create_question(question_text='Older.', days=-2)
+        newer = create_question(question_text='Newer.', days=-1)
+        future = create_question(question_text='Future.', days=5)
+        for question in (older, newer, future):
+            snapshots.refresh(question)
+        QuestionSnapshot.objects.filter(pk=newer.pk).update(payload=snapshots.encode({'id': newer.id, 'stored': True}))
+
+        resource = make_resource(QuestionResource, self.factory.get('/'))
+        # One query per shard, counted here on the default one
+        with self.assertNumQueries(1):
+            response = resource.filter()
+        self.assertEqual(response['data'][0], {'id': newer.id, 'stored': True})
+        self.assertEqual([question['id'] for question in response['data']], [newer.id, older.id])
+
+    def test_admin_edits_refresh_snapshot(self):
+        """
+        Saving a question and its choices in the admin rewrites its stored
+        document, deleting it there discards the cached one.
+        """
+        question = create_question(question_text='Admin question.', days=-1)
+        snapshots.refresh(question)
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+
+        response = self.client.post(reverse('admin:polls_question_change', args=(question.id,)), {
+            'question_text': 'Renamed in admin.',
+            'pub_date_0': question.pub_date.strftime('%Y-%m-%d'),
+            'pub_date_1': question.pub_date.strftime('%H:%M:%S'),
+            'choices-TOTAL_FORMS': '1', 'choices-INITIAL_FORMS': '0',
+            'choices-0-choice_text': 'Added in admin', 'choices-0-votes': '0',
+        })
+        self.assertEqual(response.status_code, 302)
+        document = json.loads(snapshots.load(question.id))
+        self.assertEqual(document['question_text'], 'Renamed in admin.')
+        self.assertEqual([choice['choice_text'] for choice in document['choices']], ['Added in admin'])
+
+    def test_results_view_future_question(self):
+        """
+        Questions that aren't published yet are not served.
+        """
+        question = create_question(question_text='Future question.', days=5)
+        snapshots.refresh(question)
+        response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class ClosedQuestionTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.clear()
+        self.results_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.results_dir.cleanup)
+        overrides = override_settings(POLLS_CLOSED_RESULTS_DIR=self.results_dir.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def close(self, question):
+        request = self.factory.post('/', '{"pk": %d}' % question.id, content_type='application/json')
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_resource(QuestionResource, request).close()
+
+    def test_closed_question_rejects_votes(self):
+        """
+        Once closed, a question doesn't accept votes anymore.
+        """
+        question = create_question(question_text='Closed question.', days=-1)
+        choice = Choice.objects.create(question=question, choice_text='A')
+        self.assertEqual(self.close(question)['status_code'], 200)
+
+        request = self.factory.post('/', '{"choice_id": %d}' % choice.id, content_type='application/json')
+        response = make_resource(VotingResource, request).create()
+        self.assertEqual(response['status_code'], 400)
+        choice.refresh_from_db()
+        self.assertEqual(choice.votes, 0)
+
+    def test_vote_racing_close_is_rejected(self):
+        """
+        A vote for a choice loaded while the poll was open isn't counted
+        when the close commits before the vote is written.
+        """
+        question = create_question(question_text='Closing question.', days=-1)
+        choice = Choice.objects.create(question=question, choice_text='A')
+        closed = []
+
+        def close_after_choice_loaded(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if not closed and sql.startswith('SELECT') and '"polls_choice"' in sql:
+                closed.append(True)
+                Question.objects.filter(pk=question.pk).update(closed_at=timezone.now())
+            return result
+
+        request = self.factory.post('/', '{"choice_id": %d}' % choice.id, content_type='application/json')
+        with connection.execute_wrapper(close_after_choice_loaded):
+            response = make_resource(VotingResource, request).create()
+        self.assertEqual(response['status_code'], 400)
+        choice.refresh_from_db()
+        self.assertEqual(choice.votes, 0)
+
+    def test_choice_changes_racing_close_are_rejected(self):
+        """
+        Choices can't be added, renamed or deleted once a close committed,
+        even when the question was read while it was open.
+        """
+        question = create_question(question_text='Closing question.', days=-1)
+        choice = Choice.objects.create(question=question, choice_text='A')
+        requests = [
+            (ChoiceResource.create, {'question_id': question.id, 'choice_text': 'B'}, '"polls_question"'),
+            (ChoiceResource.update, {'pk': choice.id, 'choice_text': 'Renamed'}, '"polls_choice"'),
+            (ChoiceResource.delete, {'pk': choice.id}, '"polls_choice"'),
+        ]
+        for method, data, first_table in requests:
+            Question.objects.filter(pk=question.pk).update(closed_at=None)
+            closed = []
+
+            def close_after_first_read(execute, sql, params, many, context):
+                result = execute(sql, params, many, context)
+                if not closed and sql.startswith('SELECT') and first_table in sql:
+                    closed.append(True)
+                    Question.objects.filter(pk=question.pk).update(closed_at=timezone.now())
+                return result
+
+            request = self.factory.post('/', json.dumps(data), content_type='application/json')
+            with self.subTest(method=method.__name__), connection.execute_wrapper(close_after_first_read):
+                self.assertEqual(method(make_resource(ChoiceResource, request))['status_code'], 400)
+        self.assertEqual(list(question.choices.values_list('choice_text', flat=True)), ['A'])
+
+    def test_closed_results_served_without_database(self):
+        """
+        The results of a closed question come from its static file, with
+        far-future cache headers and no queries.
+        """
+        question = create_question(question_text='Closed question.', days=-1)
+        self.close(question)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('polls:results', args=(question.id,)))
+        self.assertEqual(json.loads(response.content)['id'], question.id)
+        self.assertIn('immutable', response['Cache-Control'])
+
+
+class TaskExecutorTests(SimpleTestCase):
+    def test_same_key_tasks_are_coalesced(self):
+        """
+        Tasks enqueued under a key that is still waiting run only once.
+        """
+        executor = TaskExecutor(max_workers=1)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        executor.enqueue('blocker', lambda: (started.set(), release.wait()))
+        started.wait()
+        self.assertTrue(executor.enqueue('refresh', calls.append, 1))
+        self.assertFalse(executor.enqueue('refresh', calls.append, 2))
+        release.set()
+        executor.shutdown()
+
+        self.assertEqual(calls, [1])
+
+    def test_same_key_runs_never_overlap(self):
+        """
+        A task enqueued while its key runs waits for that run, and the
+        tasks enqueued meanwhile are folded into a single rerun.
+        """
+        executor = TaskExecutor(max_workers=2)
+        started = threading.Event()
+        release = threading.Event()
+        running = []
+        overlaps = []
+        calls = []
+
+        def refresh(value):
+            if running:
+                overlaps.append(value)
+            running.append(value)
+            started.set()
+            release.wait(5)
+            calls.append(value)
+            running.remove(value)
+
+        executor.enqueue('snapshot:1', refresh, 1)
+        started.wait(5)
+        self.assertTrue(executor.enqueue('snapshot:1', refresh, 2))
+        self.assertFalse(executor.enqueue('snapshot:1', refresh, 3))
+        # The second pool thread would pick up a parallel run here
+        time.sleep(0.1)
+        release.set()
+        executor.shutdown()
+
+        self.assertEqual(overlaps, [])
+        self.assertEqual(calls, [1, 2])
+
+    def test_failed_task_is_retried(self):
+        """
+        A failing task is run again until it succeeds or retries run out.
+        """
+        executor = TaskExecutor(max_retries=2, retry_delay=0)
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RuntimeError('try again')
+
+        with self.assertLogs('polls.tasks', 'WARNING'):
+            executor.enqueue('flaky', flaky)
+            executor.shutdown()
+        self.assertEqual(len(attempts), 3)
+
+
+@override_settings(POLLS_CHOICES_PER_QUESTION=2)
+class TopChoicesTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.question = create_question(question_text='Open question.', days=-1)
+        for votes in (3, 7, 1, 7, 5):
+            Choice.objects.create(question=self.question, choice_text='%d votes' % votes, votes=votes)
+        snapshots.refresh(self.question)
+
+    def test_payload_embeds_top_choices(self):
+        """
+        Question payloads embed only the most voted choices and flag the rest.
+        """
+        resource = make_resource(QuestionResource, self.factory.get('/'))
+        document = resource.filter()['data'][0]
+        self.assertEqual([choice['votes'] for choice in document['choices']], [7, 7])
+        self.assertIs(document['has_more_choices'], True)
+
+    def test_bulk_top_choices_stop_after_k_rows(self):
+        """
+        Loading the top choices of several questions reads about K+1 rows
+        per question, not all of their choices.
+        """
+        crowded = create_question(question_text='Crowded question.', days=-1)
+        Choice.objects.bulk_create(
+            Choice(question=crowded, choice_text='Write-in %d' % index, votes=index % 13) for index in range(3000)
+        )
+
+        def vm_steps(question_ids):
+            # SQLite calls the progress handler every N virtual machine
+            # instructions, a count proportional to the rows read
+            steps = []
+            connection.ensure_connection()
+            connection.connection.set_progress_handler(lambda: steps.append(1), 10)
+            try:
+                choices = top_choices_in_bulk(question_ids)
+            finally:
+                connection.connection.set_progress_handler(None, 10)
+            return choices, len(steps)
+
+        choices, small_steps = vm_steps([self.question.id])
+        self.assertEqual([choice.votes for choice in choices[self.question.id]], [7, 7, 5])
+        choices, crowded_steps = vm_steps([crowded.id])
+        self.assertEqual([choice.votes for choice in choices[crowded.id]], [12, 12, 12])
+        self.assertLess(crowded_steps, 2 * small_steps + 10)
+
+    def test_page_walks_all_choices(self):
+        """
+        ChoiceResource.page returns every choice once, most voted first.
+        """
+        votes, cursor = [], None
+        while True:
+            params = {'question_id': self.question.id, 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = make_resource(ChoiceResource, self.factory.get('/', params)).page()
+            votes += [choice['votes'] for choice in response['data']]
+            cursor = response['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(votes, [7, 7, 5, 3, 1])
+
+    def test_page_hides_missing_and_future_questions(self):
+        """
+        Paging the choices of a question that doesn't exist or isn't
+        published yet answers 404.
+        """
+        future = create_question(question_text='Future question.', days=5)
+        Choice.objects.create(question=future, choice_text='Hidden')
+        for question_id in (future.id, 999):
+            response = make_resource(ChoiceResource, self.factory.get('/', {'question_id': question_id})).page()
+            self.assertEqual(response['status_code'], 404)
+
+
+# Temporary shards of ShardedTestCase, named apart from POLLS_SHARD_COUNT's
+TEST_SHARDS = ['test_shard_1', 'test_shard_2']
+
+
+class ShardedTestCase(TestCase):
+    """
+    Spread polls over `default` and two temporary SQLite databases,
+    whatever POLLS_SHARD_COUNT is.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        shard_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(shard_dir.cleanup)
+        # Test databases were set up from DATABASES already, register the
+        # shards with the connections directly
+        databases = connections.configure_settings({
+            **connections.settings,
+            **{
+                alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(Path(shard_dir.name) / alias)}
+                for alias in TEST_SHARDS
+            },
+        })
+        for alias in TEST_SHARDS:
+            connections.settings[alias] = databases[alias]
+            cls.addClassCleanup(connections.settings.pop, alias)
+            cls.addClassCleanup(connections.__delitem__, alias)
+            cls.addClassCleanup(lambda alias=alias: connections[alias].close())
+
+        overrides = override_settings(POLLS_SHARDS=['default', *TEST_SHARDS])
+        overrides.enable()
+        cls.addClassCleanup(overrides.disable)
+        for alias in TEST_SHARDS:
+            call_command('migrate', database=alias, verbosity=0)
+        super().setUpClass()
+
+
+class ShardingTests(ShardedTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        cache.clear()
+
+    def create(self, question_text):
+        request = self.factory.post('/', json.dumps({'question_text': question_text}), content_type='application/json')
+        return make_resource(QuestionResource, request).create()['data']['id']
+
+    def test_questions_spread_and_merge(self):
+        """
+        New polls land on the shard their ID maps to, and filter() merges
+        the shards by publication date.
+        """
+        question_ids = [self.create('Question %d.' % index) for index in range(4)]
+        self.assertEqual(
+            {sharding.shard_for(question_id) for question_id in question_ids},
+            set(settings.POLLS_SHARDS[:4])
+        )
+
+        response = make_resource(QuestionResource, self.factory.get('/')).filter()
+        self.assertEqual([question['id'] for question in response['data']], question_ids[::-1])
+
+    def test_vote_routes_to_question_shard(self):
+        """
+        Choices are created and voted on alongside their question.
+        """
+        question_id = self.create('Sharded question.')
+        request = self.factory.post('/', json.dumps({'question_id': question_id, 'choice_text': 'A'}), content_type='application/json')
+        choice_id = make_resource(ChoiceResource, request).create()['data']['id']
+
+        request = self.factory.post('/', json.dumps({'choice_id': choice_id}), content_type='application/json')
+        self.assertEqual(make_resource(VotingResource, request).create()['data']['votes'], 1)
+        self.assertEqual(
+            Choice.objects.using(sharding.shard_for(question_id)).get(pk=choice_id).question_id,
+            question_id
+        )
+
+    def test_failed_creates_leave_no_directory_entry(self):
+        """
+        When the shard transaction fails, the directory entry allocated for
+        the new question or choice is dropped again.
+        """
+        question_id = self.create('Sharded question.')
+        for resource, data, table in [
+            (QuestionResource, {'question_text': 'Lost question.'}, 'polls_question'),
+            (ChoiceResource, {'question_id': question_id, 'choice_text': 'Lost'}, 'polls_choice'),
+        ]:
+            entries = sharding.directory().count()
+
+            def fail_insert(execute, sql, params, many, context):
+                if sql.startswith('INSERT INTO "%s"' % table):
+                    raise DatabaseError('Shard unavailable')
+                return execute(sql, params, many, context)
+
+            request = self.factory.post('/', json.dumps(data), content_type='application/json')
+            with self.subTest(table=table), ExitStack() as stack:
+                for alias in settings.POLLS_SHARDS:
+                    stack.enter_context(connections[alias].execute_wrapper(fail_insert))
+                with self.assertRaises(DatabaseError):
+                    make_resource(resource, request).create()
+            self.assertEqual(sharding.directory().count(), entries)
+
+    def test_adopt_and_rebalance_polls_from_before_sharding(self):
+        """
+        Polls created before sharding, whose question and choice IDs
+        overlap, are all adopted and can be found after being moved.
+        """
+        pub_date = timezone.now() - datetime.timedelta(days=1)
+        for question_id, choice_ids in [(2, [5]), (4, []), (5, [6, 7])]:
+            question = Question.objects.create(id=question_id, question_text='Old question.', pub_date=pub_date)
+            for choice_id in choice_ids:
+                Choice.objects.create(id=choice_id, question=question, choice_text='Old choice.')
+
+        call_command('rebalance_shards', adopt=True, stdout=StringIO())
+        call_command('rebalance_shards', all=True, stdout=StringIO())
+
+        for question_id in (2, 4, 5):
+            db = sharding.shard_for(question_id)
+            self.assertEqual(db, sharding.home_shard(question_id))
+            self.assertTrue(Question.objects.using(db).filter(pk=question_id).exists())
+            response = make_resource(QuestionResource, self.factory.get('/')).get_pk(pk=question_id)
+            self.assertEqual(response['status_code'], 200)
+        self.assertEqual(sharding.shard_for(5, sharding.CHOICE), sharding.home_shard(2))
+        self.assertEqual(sharding.shard_for(7, sharding.CHOICE), sharding.home_shard(5))
+        self.assertFalse(Question.objects.using('default').filter(pk__in=[2, 5]).exists())
+
+        # New IDs come after the adopted ones
+        self.assertGreater(sharding.allocate_question()[0], 7)
+
+    def test_adopt_fails_on_question_in_two_databases(self):
+        """
+        Adoption stops, rather than skip one of them, when two databases
+        hold a question with the same ID.
+        """
+        pub_date = timezone.now()
+        for db in ('default', TEST_SHARDS[0]):
+            Question.objects.using(db).create(id=3, question_text='Twin question.', pub_date=pub_date)
+
+        with self.assertRaisesMessage(CommandError, 'Question 3 is on both'):
+            call_command('rebalance_shards', adopt=True, stdout=StringIO())
+
+
+class HotnessTests(SimpleTestCase):
+    def test_sketch_never_undercounts(self):
+        """
+        Count-min estimates are at least the true counts.
+        """
+        sketch = CountMinSketch(width=64, depth=3)
+        for key in range(200):
+            for _ in range(key % 5):
+                sketch.add(key)
+        self.assertTrue(all(sketch.estimate(key) >= key % 5 for key in range(200)))
+
+    def test_tracker_keeps_hottest_questions(self):
+        """
+        The tracker keeps the K most accessed questions, hottest first.
+        """
+        tracker = HotTracker(width=256, depth=4, top_k=3)
+        for question_id, hits in [(1, 5), (2, 50), (3, 1), (4, 20), (5, 30)]:
+            for _ in range(hits):
+                tracker.record('get_pk', [question_id])
+        self.assertEqual([question_id for question_id, _ in tracker.hottest()], [2, 5, 4])
+        self.assertEqual(tracker.stats()['requests'], {'get_pk': 106})
+
+    @override_settings(POLLS_HOTNESS={'ENABLED': False})
+    def test_disabled_tracking_starts_no_warmer(self):
+        """
+        Reading the stats with tracking disabled doesn't start the warmer.
+        """
+        # Make get_tracker() start over in this process, and again after
+        self.addCleanup(setattr, hotness, '_pid', None)
+        hotness._pid = None
+        self.assertEqual(hotness.get_tracker().stats()['hot_questions'], [])
+        self.assertIsNone(hotness._warmer)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_computation(self):
+        """
+        Callers arriving while a key is in flight get the leader's result.
+        """
+        flight = SingleFlight()
+        computing = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            computing.set()
+            release.wait()
+            return {'status_code': 200}
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('question:1', compute)))
+        leader.start()
+        computing.wait()
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do('question:1', compute)))
+            for _ in range(5)
+        ]
+        for follower in followers:
+            follower.start()
+        # Give the followers time to join the flight before it lands
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 6)
+        self.assertTrue(all(result == {'status_code': 200} for result in results))
+        # Each caller gets its own copy of the shared result
+        self.assertEqual(len({id(result) for result in results}), 6)
+
+    def test_requests_with_different_bodies_are_not_coalesced(self):
+        """
+        Concurrent get_many calls naming their IDs in the body only share a
+        computation when the bodies are identical.
+        """
+        computing = threading.Event()
+        release = threading.Event()
+
+        class Resource:
+            def __init__(self, request):
+                self.request = request
+
+            @coalesce
+            def get_many(self, **kwargs):
+                computing.set()
+                release.wait()
+                return {'data': json.loads(self.request.body)['ids']}
+
+        def call(ids):
+            request = RequestFactory().post('/', json.dumps({'ids': ids}), content_type='application/json')
+            results[tuple(ids)] = Resource(request).get_many()
+
+        results = {}
+        first = threading.Thread(target=call, args=([1, 2],))
+        first.start()
+        computing.wait()
+        second = threading.Thread(target=call, args=([3],))
+        second.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in (first, second):
+            thread.join()
+
+        self.assertEqual(results, {(1, 2): {'data': [1, 2]}, (3,): {'data': [3]}})
+
+
+WIRE_TEST_DOCUMENT = {'status_code': 200, 'data': [{'id': 1, 'choices': [[1, 'Yes', 10]]}]}
+
+# Stands in for the API in the full middleware stack tests
+urlpatterns = [
+    path('api-sileo/v2/question/question/filter/', lambda request: JsonResponse(WIRE_TEST_DOCUMENT)),
+]
+
+
+class WireFormatTests(SimpleTestCase):
+    def test_v2_choices_are_positional_rows(self):
+        """
+        v2 question documents carry choices as rows in CHOICE_FIELDS order.
+        """
+        document = {'id': 1, 'question_text': 'Q?', 'choices': [{'id': 3, 'choice_text': 'A', 'votes': 2}]}
+        response = wire.response_v2({'status_code': 200, 'data': [document]}, wire.question_v2)
+        self.assertEqual(response['choice_fields'], ['id', 'choice_text', 'votes'])
+        self.assertEqual(response['data'][0]['choices'], [[3, 'A', 2]])
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_negotiated_through_accept(self):
+        """
+        v2 responses are re-encoded as MessagePack when the client asks.
+        """
+        middleware = MessagePackMiddleware(lambda request: JsonResponse({'data': [1, 2]}))
+        request = RequestFactory().get('/api-sileo/v2/question/question/filter/', HTTP_ACCEPT='application/msgpack')
+        response = middleware(request)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), {'data': [1, 2]})
+        self.assertIn('Accept', response['Vary'])
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_msgpack_refused_with_zero_quality(self):
+        """
+        A client listing MessagePack with q=0, or below JSON, gets JSON.
+        """
+        middleware = MessagePackMiddleware(lambda request: JsonResponse({'data': [1, 2]}))
+        for accept in ('application/msgpack;q=0', 'application/json, application/msgpack;q=0.5'):
+            request = RequestFactory().get('/api-sileo/v2/question/question/filter/', HTTP_ACCEPT=accept)
+            with self.subTest(accept=accept):
+                self.assertEqual(middleware(request)['Content-Type'], 'application/json')
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    def test_v2_document_packed_without_json_rendering(self):
+        """
+        A v2 resource hands its document to the middleware, leaving only the
+        status to render as JSON.
+        """
+        document = {'id': 1, 'question_text': 'Q?', 'choices': [{'id': 3, 'choice_text': 'A', 'votes': 2}]}
+        rendered = []
+
+        def view(request):
+            result = wire.response_v2({'status_code': 200, 'data': document}, wire.question_v2, request)
+            rendered.append(result)
+            return JsonResponse(result)
+
+        request = RequestFactory().get('/api-sileo/v2/question/question/get_pk/1/', HTTP_ACCEPT='application/msgpack')
+        response = MessagePackMiddleware(view)(request)
+        self.assertEqual(rendered, [{'status_code': 200}])
+        self.assertEqual(msgpack.unpackb(response.content), {
+            'status_code': 200, 'choice_fields': ['id', 'choice_text', 'votes'], 'data': wire.question_v2(document),
+        })
+
+    @skipUnless(msgpack, 'msgpack is not installed')
+    @override_settings(ROOT_URLCONF='polls.tests')
+    def test_msgpack_content_length_through_middleware_stack(self):
+        """
+        Through the configured middleware of both profiles, the
+        Content-Length of a MessagePack response is that of its body.
+        """
+        from geloPolls import settings_api
+
+        for middleware in (settings.MIDDLEWARE, settings_api.MIDDLEWARE):
+            with self.subTest(middleware=middleware), override_settings(MIDDLEWARE=middleware):
+                response = self.client.get(
+                    '/api-sileo/v2/question/question/filter/', HTTP_ACCEPT='application/msgpack'
+                )
+                self.assertEqual(response['Content-Type'], 'application/msgpack')
+                self.assertEqual(int(response['Content-Length']), len(response.content))
+                self.assertEqual(msgpack.unpackb(response.content), WIRE_TEST_DOCUMENT)
+
+
+class ProfilingTests(SimpleTestCase):
+    def test_signed_request_is_captured(self):
+        """
+        A request carrying the signed header is profiled and saved as pstats
+        tagged with its resource and method, later turned into folded stacks
+        by profiling_collapse.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        options = {'ENABLED': True, 'THRESHOLD_MS': 0, 'DIR': directory.name}
+
+        def view(request):
+            sum(range(10000))
+            return JsonResponse({})
+
+        request = RequestFactory().get(
+            '/api-sileo/v1/question/question/filter/', HTTP_X_POLLS_PROFILE=profiling.make_token()
+        )
+        with override_settings(POLLS_PROFILING=options):
+            ProfilingMiddleware(view)(request)
+            ProfilingMiddleware(view)(RequestFactory().get('/api-sileo/v1/question/question/get_pk/'))
+
+        captures = list(Path(directory.name).iterdir())
+        self.assertEqual([path.suffix for path in captures], ['.pstats'])
+        self.assertIn('-question-filter-', captures[0].name)
+
+        call_command('profiling_collapse', dir=directory.name, stdout=StringIO())
+        collapsed = captures[0].with_suffix('.collapsed').read_text()
+        self.assertRegex(collapsed, r'view;<built-in method builtins.sum> \d+')
+
+    def test_concurrent_request_is_served_unprofiled(self):
+        """
+        While a request is being profiled, others are served without a
+        capture instead of failing on the single process-wide profiler.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        options = {'ENABLED': True, 'THRESHOLD_MS': 0, 'DIR': directory.name}
+        request = RequestFactory().get(
+            '/api-sileo/v1/question/question/filter/', HTTP_X_POLLS_PROFILE=profiling.make_token()
+        )
+
+        with override_settings(POLLS_PROFILING=options), _profiling_lock:
+            response = ProfilingMiddleware(lambda request: JsonResponse({}))(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Path(directory.name).iterdir()), [])
+
+
+class SlowQueryLogTests(TestCase):
+    def test_slow_query_is_logged_with_its_plan(self):
+        """
+        Queries over the threshold are logged with the resource and method
+        of the request, and a full table scan is flagged once per shape.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        log = Path(directory.name) / 'slow.jsonl'
+        querylog._explained.clear()
+
+        def view(request):
+            list(Question.objects.filter(question_text__icontains='x').order_by('-pub_date'))
+            list(Question.objects.filter(question_text__icontains='y').order_by('-pub_date'))
+            return JsonResponse({})
+
+        options = {'THRESHOLD_MS': 0, 'LOG_FILE': log}
+        with override_settings(POLLS_SLOW_QUERIES=options), self.assertLogs('polls.querylog', 'WARNING'):
+            SlowQueryMiddleware(view)(RequestFactory().get('/api-sileo/v1/question/question/filter/'))
+
+        entries = [json.loads(line) for line in log.read_text().splitlines()]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual([entries[0]['resource'], entries[0]['method']], ['question', 'filter'])
+        self.assertEqual(entries[0]['shape'], entries[1]['shape'])
+        self.assertIn('full table scan of polls_question', entries[0]['flags'])
+        self.assertNotIn('plan', entries[1])
+
+        out = StringIO()
+        call_command('slow_queries', file=str(log), stdout=out)
+        self.assertIn('2 x', out.getvalue())
+        self.assertIn('full table scan of polls_question', out.getvalue())
+
+
+class ApiSettingsTests(TestCase):
+
+    def test_api_profile_requests_carry_a_user(self):
+        """
+        The API-only profile keeps the middleware that sets request.user,
+        which Sileo resources may rely on.
+        """
+        from geloPolls import settings_api
+        question = create_question(question_text='Lean question.', days=-1)
+        with override_settings(MIDDLEWARE=settings_api.MIDDLEWARE, ROOT_URLCONF=settings_api.ROOT_URLCONF):
+            response = self.client.get('/polls/%d/results.json' % question.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+        self.assertTrue({'django.contrib.auth', 'django.contrib.contenttypes'} <= set(settings_api.INSTALLED_APPS))
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'polls'
+urlpatterns = [
+    path('<int:pk>/results.json', views.question_results, name='results'),
+]
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+
+from . import sharding, snapshots
+from .models import Question
+
+# Closed poll results never change, let clients and proxies keep them
+CLOSED_RESULTS_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def question_results(request, pk):
+    """
+    Serve the stored result document of a question as-is: one primary key
+    lookup, no model instances and no JSON encoding. Closed polls are
+    answered from their static file without touching the database.
+    """
+    if settings.POLLS_CLOSED_RESULTS_URL and snapshots.closed_path(pk).exists():
+        return redirect('%s%d.json' % (settings.POLLS_CLOSED_RESULTS_URL, pk), permanent=True)
+
+    payload = snapshots.load_closed(pk)
+    if payload is not None:
+        response = HttpResponse(payload, content_type='application/json')
+        patch_cache_control(response, public=True, max_age=CLOSED_RESULTS_MAX_AGE, immutable=True)
+        return response
+
+    payload = snapshots.load(pk)
+    if payload is None:
+        # First access, or the question isn't published
+        try:
+            question = Question.objects.using(sharding.shard_for(pk)).get(pk=pk, pub_date__lte=timezone.now())
+        except Question.DoesNotExist:
+            raise Http404('Question not found')
+        payload = snapshots.refresh(question)
+    return HttpResponse(payload, content_type='application/json')
@@ -0,0 +1,52 @@
+"""
+Compact v2 wire format.
+
+v1 payloads repeat the `id`, `choice_text` and `votes` keys for every
+choice. v2 sends choices as positional rows described once per response by
+`choice_fields`:
+
+    {"choice_fields": ["id", "choice_text", "votes"],
+     "data": {"id": 1, ..., "choices": [[1, "Yes", 10], [2, "No", 3]]}}
+
+Clients sending `Accept: application/msgpack` get the same document as
+MessagePack when the optional `msgpack` package is installed, see
+polls.middleware.MessagePackMiddleware. The middleware then encodes the
+resource's own dictionary, never a JSON rendering of it.
+"""
+CHOICE_FIELDS = ['id', 'choice_text', 'votes']
+
+
+def choice_row(choice):
+    """
+    Positional row of a v1 choice dictionary.
+    """
+    return [choice['id'], choice['choice_text'], choice['votes']]
+
+
+def question_v2(document):
+    """
+    Convert a v1 question document to v2.
+    """
+    return {**document, 'choices': [choice_row(choice) for choice in document['choices']]}
+
+
+def response_v2(response, convert, request=None):
+    """
+    Convert the `data` of a v1 resource response with `convert`, applied to
+    each item when it is a list, and describe the choice rows.
+
+    When MessagePackMiddleware answers `request`, the document is handed to
+    it and only the status is left for Sileo to render.
+    """
+    if response.get('status_code') not in (200, 201) or 'data' not in response:
+        return response
+    data = response['data']
+    data = [convert(item) for item in data] if isinstance(data, list) else convert(data)
+    response = {**response, 'choice_fields': CHOICE_FIELDS, 'data': data}
+
+    # Handling MessagePack: skip rendering a JSON body nobody will read
+    msgpack_response = getattr(request, 'msgpack_response', None)
+    if msgpack_response is None:
+        return response
+    msgpack_response['document'] = response
+    return {'status_code': response['status_code']}